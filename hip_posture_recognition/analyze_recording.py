@@ -0,0 +1,155 @@
+"""
+Re-analyze a recorded session without a camera.
+
+Reads a video file, stream URL or directory of images and runs every frame through
+the Camera analysis pipeline (pose detection, smoothing, frame tilt and angles) as
+fast as frames can be decoded, then writes one row of PostureMeasurements per frame:
+
+    python analyze_recording.py --source session.mp4 --output session.csv
+    python analyze_recording.py --source frames/ --fps 15 --output frames.parquet
+
+Parquet output needs pandas with pyarrow (or fastparquet), which are optional.
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+from camera import Camera, PERFORMANCE_PROFILES
+from measurement_store import MeasurementStore
+from sources import open_source
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('frame', 'time', 'pose_detected', 'shoulder_angle', 'hip_angle', 'tilt_angle', 'frame_tilt')
+FORMATS = ('csv', 'parquet')
+
+
+def analyze(source, camera, max_frames=None):
+    """
+    Yield one result row (dict with FIELDS) per frame of the source.
+
+    Frames are analyzed unpaced; the smoothing filter gets the position of the frame
+    in the recording as its timestamp, so the result does not depend on processing speed.
+    """
+    while max_frames is None or source.frame_index + 1 < max_frames:
+        ret, frame = source.read()
+        if not ret:
+            break
+        timestamp = source.timestamp
+        analysis = camera.analyze_frame(frame, timestamp=timestamp)
+        measurements = analysis.measurements
+        yield {
+            'frame': source.frame_index,
+            'time': round(timestamp, 3),
+            'pose_detected': measurements is not None,
+            'shoulder_angle': measurements.shoulder_angle if measurements else None,
+            'hip_angle': measurements.hip_angle if measurements else None,
+            'tilt_angle': measurements.tilt_angle if measurements else None,
+            'frame_tilt': analysis.frame_tilt
+        }
+
+
+def write_csv(rows, path):
+    """
+    Write the rows to a CSV file as they come, so long recordings need no extra memory.
+    """
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def check_parquet_support():
+    """
+    Fail before any frame is analyzed if pandas or a Parquet engine (pyarrow or
+    fastparquet) is missing, instead of after the whole recording.
+    """
+    import importlib.util
+
+    message = "Parquet output requires pandas and pyarrow: pip install pandas pyarrow"
+    if importlib.util.find_spec('pandas') is None:
+        raise RuntimeError(message)
+    if importlib.util.find_spec('pyarrow') is None and importlib.util.find_spec('fastparquet') is None:
+        raise RuntimeError(message)
+
+
+def write_parquet(rows, path):
+    """
+    Write the rows to a Parquet file (requires pandas and a Parquet engine, see check_parquet_support).
+    """
+    import pandas as pd
+
+    columns = {field: [] for field in FIELDS}
+    for row in rows:
+        for field in FIELDS:
+            columns[field].append(row[field])
+    pd.DataFrame(columns).to_parquet(path, index=False)
+    return len(columns['frame'])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a recorded session frame by frame.")
+    parser.add_argument('--source', required=True,
+                        help="Video file, stream URL (e.g. rtsp://) or directory of images")
+    parser.add_argument('--output', required=True, help="Result file (.csv or .parquet)")
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help="Output format (default: from the output file extension, else csv)")
+    parser.add_argument('--fps', type=float, default=None,
+                        help="Frame rate of an image sequence, for the time column (default 30)")
+    parser.add_argument('--profile', choices=list(PERFORMANCE_PROFILES.keys()), default='balanced',
+                        help="Performance profile (Pose model)")
+    parser.add_argument('--tilt-mode', choices=('adaptive', 'per_frame'), default='adaptive')
+    parser.add_argument('--no-roi', action='store_true', help="Disable ROI tracking")
+    parser.add_argument('--no-smoothing', action='store_true', help="Disable landmark smoothing")
+    parser.add_argument('--max-frames', type=int, default=None, help="Stop after this many frames")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+    args = parse_args(argv)
+    output_format = args.format
+    if output_format is None:
+        output_format = 'parquet' if os.path.splitext(args.output)[1].lower() == '.parquet' else 'csv'
+
+    try:
+        if output_format == 'parquet':
+            check_parquet_support()
+        source = open_source(args.source, fps=args.fps)
+    except (ValueError, RuntimeError) as e:
+        logger.error(f"{e}")
+        return 1
+
+    # The camera is only used for its analysis pipeline: no device, no stored measurements
+    camera = Camera(test_mode=True, profile=args.profile, tilt_mode=args.tilt_mode,
+                    roi_tracking=not args.no_roi, smoothing=not args.no_smoothing,
+                    store=MeasurementStore(':memory:'))
+    logger.info(f"Analyzing {args.source} ({source.frame_count or 'unknown number of'} frames, {source.fps:.1f} fps)")
+
+    started = time.perf_counter()
+    try:
+        rows = analyze(source, camera, max_frames=args.max_frames)
+        if output_format == 'parquet':
+            count = write_parquet(rows, args.output)
+        else:
+            count = write_csv(rows, args.output)
+    except RuntimeError as e:
+        logger.error(f"{e}")
+        return 1
+    finally:
+        source.release()
+
+    elapsed = time.perf_counter() - started
+    fps = count / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Wrote {count} frames to {args.output} in {elapsed:.1f} s ({fps:.1f} fps)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
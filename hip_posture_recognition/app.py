@@ -1,20 +1,41 @@
 import os
+from startup_timing import STARTUP
+
+# 'threading' (development server) or 'gevent' (production: event loop for viewers,
+# real threads for the camera pipeline). Patching must happen before anything else imports socket.
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'threading')
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all(thread=False)
+    # Importing mediapipe runs a subprocess (ldconfig), which patched subprocess can only
+    # wait for on the main thread, so it cannot be left to the camera's bring-up thread
+    import mediapipe
+
 import logging
 import json
 from flask import Flask, render_template, Response, jsonify, request, send_file
-from flask_socketio import SocketIO, emit
-from camera import Camera, PostureThresholds
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.utils import ImageReader
+from werkzeug.wsgi import ClosingIterator
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from camera import Camera, PostureThresholds, PERFORMANCE_PROFILES
+from device_registry import get_default_registry
+from measurement_emitter import MeasurementEmitter
+from frame_broadcast import FrameBroadcaster
+from frame_stream import FrameStreamer
+from history_stats import HistoryStatistics, BUCKETS
+from history_view import HistoryView, format_records, encode_cursor, decode_cursor
+from report import ReportRenderer, FileStream
+from report_jobs import ReportJobManager
+from metrics import REGISTRY, CONTENT_TYPE, FRAMES_STREAMED, VIEWERS, EVENTS_EMITTED, TEST_MODE, TEST_MODE_FALLBACKS
 from datetime import datetime
 import time
 import math
+import threading
+from dataclasses import asdict
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
+STARTUP.mark('imports')
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", os.urandom(24).hex())
@@ -27,7 +48,7 @@ print("Static folder path:", app.static_folder)
 socketio = SocketIO(
     app,
     cors_allowed_origins="*",
-    async_mode='threading',
+    async_mode=ASYNC_MODE,
     logger=True,
     engineio_logger=True,
     ping_timeout=5000,
@@ -39,7 +60,66 @@ socketio = SocketIO(
     reconnection_delay_max=5000
 )
 
+# How the dashboard receives video: 'mjpeg' (/video_feed), 'socketio' (binary 'frame'
+# messages with measurements and per-frame acks) or 'landmarks' (raw /video_feed/raw with
+# the overlay drawn by the browser from 'pose' events); ?transport= overrides it per page
+VIDEO_TRANSPORTS = ('mjpeg', 'socketio', 'landmarks')
+VIDEO_TRANSPORT = os.environ.get('VIDEO_TRANSPORT', 'mjpeg')
+
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+
+# Upper bound of the measurement after a profile switch, which holds the request
+MAX_MEASURE_SECONDS = 10.0
+
+# Directory of the recordings /select_camera may replay (camera_type 'file'). Unset, file
+# sources are only available to the command line tools (analyze_recording.py, benchmark.py)
+RECORDINGS_DIR = os.environ.get('RECORDINGS_DIR')
+
+TEST_MODE.set_function(lambda: camera is not None and camera.test_mode)
+
+# Logos are decoded once here and reused for every report
+report_renderer = ReportRenderer(app.static_folder)
+
+def create_lock():
+    """
+    Lock for state that request handlers set up while blocking (e.g. opening the camera).
+    In gevent mode handlers are greenlets of one thread, which a thread lock would deadlock.
+    """
+    if ASYNC_MODE == 'gevent':
+        from gevent.lock import RLock
+        return RLock()
+    return threading.Lock()
+
+def run_blocking(function, *args, **kwargs):
+    """
+    Call a function that blocks on native code or real threads (building a Pose graph,
+    joining the camera's pipeline threads). In gevent mode it runs in the hub's
+    threadpool, so the other greenlets are served in the meantime.
+    """
+    if ASYNC_MODE == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(function, args, kwargs)
+    return function(*args, **kwargs)
+
 camera = None
+camera_lock = create_lock()
+# Change-driven 'measurements' messages with per-client acks, fed by emit_measurements
+measurement_emitter = MeasurementEmitter(
+    socketio.emit,
+    deadband=float(os.environ.get('MEASUREMENT_DEADBAND', 0.2)),
+    keepalive_interval=float(os.environ.get('MEASUREMENT_KEEPALIVE', 1.0))
+)
+measurement_task = None
+measurement_task_lock = threading.Lock()
+history_statistics = None
+history_view = None
+report_jobs = None
+report_jobs_lock = threading.Lock()
+frame_broadcaster = None
+# SocketIO clients in the room receiving a 'pose' event per frame
+POSE_ROOM = 'pose'
+pose_clients = set()
 
 def parse_timestamp(ts):
     """
@@ -63,26 +143,144 @@ def parse_timestamp(ts):
                 raise ValueError(f"Unsupported timestamp format: {ts}")
     raise ValueError(f"Unsupported timestamp type: {type(ts)} ({ts})")
 
+def resolve_recording(name):
+    """
+    Return the path of a recording under RECORDINGS_DIR for a source given over HTTP.
+
+    :param name: File or image directory name relative to RECORDINGS_DIR.
+    :raises ValueError: If file sources are disabled, or the name is absolute, a URL,
+                        a glob, contains '..' or leads outside RECORDINGS_DIR.
+    """
+    if not RECORDINGS_DIR:
+        raise ValueError("Replaying recordings is disabled (RECORDINGS_DIR is not set)")
+    if not isinstance(name, str) or not name:
+        raise ValueError("camera_type 'file' requires a source")
+    if os.path.isabs(name) or '://' in name or any(c in name for c in '*?[') \
+            or '..' in name.replace('\\', '/').split('/'):
+        raise ValueError(f"Invalid recording name: {name}")
+    root = os.path.realpath(RECORDINGS_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not os.path.exists(path):
+        raise ValueError(f"Unknown recording: {name}")
+    return path
+
+def get_history_page(start=None, end=None, limit=HISTORY_PAGE_SIZE, cursor=None):
+    """
+    Load one page of history records.
+
+    :return: (list of record dicts, cursor of the next page or None)
+    """
+    cam = get_camera()
+    page, next_key = cam.get_measurements_page(start=start, end=end, limit=limit, after=decode_cursor(cursor))
+    records = format_records(
+        [record_id for record_id, _ in page],
+        [m.timestamp for _, m in page],
+        [m.shoulder_angle for _, m in page],
+        [m.hip_angle for _, m in page],
+        [m.tilt_angle for _, m in page]
+    )
+    return records, encode_cursor(*next_key) if next_key else None
+
+def get_history_view():
+    """
+    Returns the cached view-model of the history page, creating it on first use.
+    """
+    global history_view
+    if history_view is None:
+        history_view = HistoryView(get_camera().store, page_size=HISTORY_PAGE_SIZE)
+    return history_view
+
+def get_history_statistics():
+    """
+    Returns the statistics aggregator of the measurement store, creating it on first use.
+    """
+    global history_statistics
+    if history_statistics is None:
+        history_statistics = HistoryStatistics(get_camera().store)
+    return history_statistics
+
+def get_report_jobs():
+    """
+    Returns the background report job manager, creating it on first use.
+    """
+    global report_jobs
+    with report_jobs_lock:
+        if report_jobs is None:
+            report_jobs = ReportJobManager(report_renderer, get_camera().store)
+        return report_jobs
+
+def parse_report_params(values):
+    """
+    Parse the optional report range from query or JSON values:
+    from/to (epoch seconds or ISO 8601) and limit (last N measurements).
+    Raises ValueError for invalid values.
+    """
+    start = parse_timestamp(values['from']).timestamp() if values.get('from') else None
+    end = parse_timestamp(values['to']).timestamp() if values.get('to') else None
+    limit = int(values['limit']) if values.get('limit') else None
+    if limit is not None and limit < 1:
+        raise ValueError(f"Invalid limit: {limit}")
+    return {'from': start, 'to': end, 'limit': limit}
+
+def watch_first_frame(cam):
+    """
+    Record the time of the first frame the camera delivers after its bring-up.
+    """
+    def listener(frame_id):
+        if not cam.starting:
+            cam.remove_frame_listener(listener)
+            STARTUP.mark('first_frame')
+    cam.add_frame_listener(listener)
+
 def get_camera():
     """
     Returns the global camera instance. If it's not initialized,
     create it (pc_camera by default), or if something fails, create a test_mode camera.
+    The camera is brought up in the background (Pose graph, warm-up, device), so this
+    returns at once and the video shows a placeholder until the camera is ready.
     """
     global camera
-    if camera is None:
-        try:
-            camera = Camera(camera_type='pc_camera', test_mode=False)
-            # Example: you could set a frame_buffer_size property if you like
-            # camera.frame_buffer_size = 10
-            logger.info("Camera initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize camera: {e}")
-            camera = Camera(test_mode=True)
+    if camera is not None:
+        return camera
+    with camera_lock:
+        if camera is None:
+            try:
+                new_camera = Camera(camera_type='pc_camera', test_mode=False, background_init=True)
+                logger.info("Camera bring-up started")
+            except Exception as e:
+                logger.error(f"Failed to initialize camera: {e}")
+                TEST_MODE_FALLBACKS.inc()
+                new_camera = Camera(test_mode=True, background_init=True)
+            watch_first_frame(new_camera)
+            new_camera.start()
+            camera = new_camera
     return camera
 
+def get_frame_source(cam):
+    """
+    Return the object viewers wait on for new frames: the camera itself in threading
+    mode, a FrameBroadcaster in gevent mode (greenlets must not block on the camera's
+    thread condition).
+    """
+    global frame_broadcaster
+    if ASYNC_MODE != 'gevent':
+        return cam
+    # All greenlets run in one thread: no lock needed between the check and the swap
+    if frame_broadcaster is None or frame_broadcaster.camera is not cam:
+        if frame_broadcaster is not None:
+            frame_broadcaster.close()
+        frame_broadcaster = FrameBroadcaster(cam)
+    return frame_broadcaster
+
+# Sender tasks for clients that receive the video over SocketIO
+frame_streamer = FrameStreamer(socketio, lambda: get_frame_source(get_camera()))
+
 @app.route('/')
 def index():
-    return render_template('dashboard.html')
+    transport = request.args.get('transport', VIDEO_TRANSPORT)
+    if transport not in VIDEO_TRANSPORTS:
+        transport = 'mjpeg'
+    return render_template('dashboard.html', video_transport=transport)
 
 @app.route('/capture_measurement', methods=['POST'])
 def capture_measurement():
@@ -105,87 +303,256 @@ def capture_measurement():
 
 @app.route('/history')
 def history():
+    """
+    Render the history page with the newest page of records; history.js loads
+    further pages from /api/history while scrolling.
+    """
     try:
-        cam = get_camera()
-        captured_measurements = cam.get_measurements_history()
-        
-        if not captured_measurements:
-            return render_template('history.html', history=[], history_json=json.dumps([]))
-        
-        history_data = []
-        for m in captured_measurements:
-            try:
-                dt = parse_timestamp(m.timestamp)
-                history_data.append({
-                    'timestamp': dt.strftime('%Y-%m-%d %H:%M:%S'),
-                    'measurements': {
-                        'shoulder_angle': round(float(m.shoulder_angle), 1),
-                        'hip_angle': round(float(m.hip_angle), 1),
-                        'tilt_angle': round(float(m.tilt_angle), 1)
-                    }
-                })
-            except Exception as e:
-                logger.error(f"Error processing measurement: {e}")
-                continue
-
+        records, history_json, next_cursor = get_history_view().first_page()
         return render_template('history.html',
-                               history=history_data,
-                               history_json=json.dumps(history_data))
+                               history=records,
+                               history_json=history_json,
+                               next_cursor=next_cursor or '',
+                               page_size=HISTORY_PAGE_SIZE)
     except Exception as e:
         logger.error(f"Error rendering history page: {e}")
         return render_template('error.html', error=str(e))
 
+@app.route('/api/history')
+def api_history():
+    """
+    Return one page of captured measurements, newest first.
+
+    Query parameters:
+      from, to: time range (epoch seconds or ISO 8601), 'to' is exclusive
+      limit: page size (default 50, at most 500)
+      cursor: next_cursor of the previous page
+    """
+    try:
+        start = parse_timestamp(request.args['from']).timestamp() if request.args.get('from') else None
+        end = parse_timestamp(request.args['to']).timestamp() if request.args.get('to') else None
+        limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+        if limit < 1:
+            raise ValueError(f"Invalid limit: {limit}")
+        limit = min(limit, MAX_HISTORY_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        decode_cursor(cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        records, next_cursor = get_history_page(start=start, end=end, limit=limit, cursor=cursor)
+        return jsonify({
+            'items': records,
+            'next_cursor': next_cursor,
+            'limit': limit
+        })
+    except Exception as e:
+        logger.error(f"Error loading history page: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/history/stats')
+def api_history_stats():
+    """
+    Return per-bucket statistics of the captured measurements, oldest bucket first.
+
+    Query parameters:
+      bucket: day (default), week or month
+      from, to: time range (epoch seconds or ISO 8601)
+    """
+    try:
+        bucket = request.args.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket: {bucket}")
+        start = parse_timestamp(request.args['from']).timestamp() if request.args.get('from') else None
+        end = parse_timestamp(request.args['to']).timestamp() if request.args.get('to') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        cam = get_camera()
+        return jsonify({
+            'bucket': bucket,
+            'thresholds': asdict(cam.thresholds),
+            'buckets': get_history_statistics().compute(bucket, cam.thresholds, start=start, end=end)
+        })
+    except Exception as e:
+        logger.error(f"Error computing history statistics: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/clear_history', methods=['POST'])
 def clear_history():
     try:
         cam = get_camera()
         cam.clear_measurements()
+        get_history_statistics().invalidate()
         return jsonify({'status': 'success'})
     except Exception as e:
         logger.error(f"Error clearing history: {e}")
         return jsonify({'error': str(e)}), 500
 
-def generate_frames():
+def generate_frames(kind='annotated'):
+    """
+    Stream the shared latest frame to one MJPEG viewer.
+    Frames are produced once by the camera thread, no matter how many viewers are connected.
+
+    :param kind: 'annotated' for the video with overlay, 'raw' for the lower-rate video
+                 without overlay (the client draws it from the 'pose' events).
+    """
+    cam = None
+    frame_id = None
+    VIEWERS.inc()
+
+    try:
+        while True:
+            try:
+                current = camera if camera is not None else get_camera()
+                if current is not cam:
+                    # First frame, or the camera was switched via /select_camera
+                    if cam is not None:
+                        cam.remove_viewer(kind)
+                    current.add_viewer(kind)
+                    cam = current
+                    frame_id = None
+
+                source = get_frame_source(cam)
+                if kind == 'raw':
+                    frame_id, frame = source.wait_for_raw_frame(frame_id)
+                else:
+                    frame_id, frame, _ = source.wait_for_frame(frame_id)
+                if frame is not None:
+                    # The multipart part is built once per frame by the encoder and shared by all viewers
+                    yield frame.multipart
+                    FRAMES_STREAMED.inc()
+
+            except Exception as e:
+                logger.error(f"Error generating frames: {e}")
+                socketio.sleep(0.1)
+                continue
+    finally:
+        # Runs when the viewer disconnects and the response generator is closed
+        VIEWERS.dec()
+        if cam is not None:
+            cam.remove_viewer(kind)
+
+def emit_measurements():
+    """
+    Background task that emits the measurements of the shared latest frame
+    to all SocketIO clients. Runs once per process, independent of the number of viewers.
+    Only changes beyond the deadband (or keepalives) are sent, see MeasurementEmitter.
+    Clients that draw the overlay themselves also get a 'pose' event for every frame.
+    """
     cam = get_camera()
-    last_emit_time = 0
-    emit_interval = 1/30  # Limit to ~30 FPS for socket emissions
-    
+    frame_id = None
+
     while True:
         try:
-            frame, measurements = cam.get_frame()
-            if frame is not None:
-                current_time = time.time()
-                
-                # Throttle measurement emissions
-                if measurements and (current_time - last_emit_time) >= emit_interval:
-                    try:
-                        data = {
-                            'shoulder_angle': round(float(measurements.shoulder_angle), 2),
-                            'hip_angle': round(float(measurements.hip_angle), 2),
-                            'tilt_angle': round(float(measurements.tilt_angle), 2)
-                        }
-                        socketio.emit('measurements', data)
-                        last_emit_time = current_time
-                    except Exception as e:
-                        logger.error(f"Error emitting measurements: {e}")
-                        continue
-
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-                
-                # Add small sleep to prevent CPU overload
-                time.sleep(0.01)
-                
+            if camera is not None and cam is not camera:
+                cam = camera
+                frame_id = None
+
+            frame_id, analysis, frame_size = get_frame_source(cam).wait_for_pose(frame_id)
+            if analysis is None:
+                # No new frame: send samples that were held back until a client's ack arrived
+                measurement_emitter.flush()
+                continue
+            measurement_emitter.submit(analysis.measurements)
+            if pose_clients:
+                pose = cam.describe_pose(analysis, frame_size)
+                pose['id'] = frame_id
+                socketio.emit('pose', pose, to=POSE_ROOM)
+                EVENTS_EMITTED.labels('pose').inc()
+
         except Exception as e:
-            logger.error(f"Error generating frames: {e}")
-            time.sleep(0.1)
-            continue
+            logger.error(f"Error emitting measurements: {e}")
+            socketio.sleep(0.1)
+
+def start_measurement_emitter():
+    """
+    Start the measurement emitter background task if it is not running yet.
+    """
+    global measurement_task
+    with measurement_task_lock:
+        if measurement_task is None:
+            measurement_task = socketio.start_background_task(emit_measurements)
 
 @app.route('/video_feed')
 def video_feed():
     return Response(generate_frames(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/video_feed/raw')
+def raw_video_feed():
+    """
+    Video without overlay at a lower rate and JPEG quality, for clients that draw the
+    overlay from the 'pose' events.
+    """
+    return Response(generate_frames('raw'),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/metrics')
+def metrics():
+    """
+    Pipeline metrics in the Prometheus text exposition format.
+    """
+    try:
+        return Response(REGISTRY.expose(), content_type=CONTENT_TYPE)
+    except Exception as e:
+        logger.error(f"Error collecting metrics: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/pipeline_stats')
+def pipeline_stats():
+    """
+    Report per-stage timings of the capture pipeline and the number of dropped frames.
+    """
+    try:
+        cam = get_camera()
+        stats = cam.get_pipeline_stats()
+        stats['startup'] = STARTUP.snapshot()
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"Error getting pipeline stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/performance_profile', methods=['GET', 'POST'])
+def performance_profile():
+    """
+    GET: report the active performance profile and the available ones.
+    POST: switch the Pose graph and capture resolution to another profile, e.g.
+      { "profile": "low-latency" }
+    and report the measured FPS and latency after the switch.
+    """
+    try:
+        cam = get_camera()
+        if request.method == 'POST':
+            data = request.json or {}
+            name = data.get('profile')
+            if name not in PERFORMANCE_PROFILES:
+                return jsonify({'error': f"Unknown performance profile: {name}"}), 400
+            try:
+                measure_seconds = float(data.get('measure_seconds', 2.0))
+            except (TypeError, ValueError):
+                measure_seconds = None
+            if measure_seconds is None or not 0 < measure_seconds <= MAX_MEASURE_SECONDS:
+                return jsonify({'error': f"measure_seconds must be a number of seconds "
+                                         f"above 0 and at most {MAX_MEASURE_SECONDS:g}"}), 400
+            run_blocking(cam.set_performance_profile, name)
+            time.sleep(0.5)  # Let the pipeline settle on the new graph before measuring
+            performance = cam.measure_performance(duration=measure_seconds)
+        else:
+            performance = None
+
+        return jsonify({
+            'profile': cam.profile_name,
+            'settings': asdict(cam.profile),
+            'available_profiles': list(PERFORMANCE_PROFILES.keys()),
+            'performance': performance
+        })
+    except Exception as e:
+        logger.error(f"Error switching performance profile: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/get_thresholds')
 def get_thresholds():
     try:
@@ -220,138 +587,122 @@ def update_thresholds():
 
 @app.route('/generate_report')
 def generate_report():
+    """
+    Stream the PDF report. Optional query parameters limit the measurements:
+      from, to: time range (epoch seconds or ISO 8601)
+      limit: only the last N measurements
+    """
     try:
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import letter
-        from reportlab.lib.utils import ImageReader
+        params = parse_report_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
+    try:
         cam = get_camera()
-        captured_measurements = cam.get_measurements_history()
-        
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
+        measurements = cam.store.iter_measurements(start=params['from'], end=params['to'],
+                                                   limit=params['limit'], newest_first=True)
+        body = FileStream(report_renderer.render_to_tempfile(measurements))
+    except Exception as e:
+        logger.error(f"Error generating report: {e}")
+        return jsonify({'error': str(e)}), 500
 
-        # Add logos
-        try:
-            hhn_logo = ImageReader(os.path.join(app.static_folder, 'img', 'hhn_logo.png'))
-            p.drawImage(hhn_logo, 50, height - 100, width=100, height=80, mask='auto')
-            
-            unity_logo = ImageReader(os.path.join(app.static_folder, 'img', 'unityLab.jpg'))
-            p.drawImage(unity_logo, width - 120, height - 80, width=70, height=60, mask='auto')
-        except Exception as e:
-            logger.error(f"Error loading logos: {e}")
-
-        # Title and header
-        p.setFont("Helvetica-Bold", 24)
-        p.drawString(50, height - 150, "Scoliosis Analysis Report")
-        p.setFont("Helvetica", 12)
-        p.drawString(50, height - 180, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-
-        if captured_measurements:
-            # Most recent measurement
-            last_measurement = captured_measurements[0]
-            p.setFont("Helvetica-Bold", 16)
-            p.drawString(50, height - 220, "Latest Captured Measurement")
-            p.setFont("Helvetica", 12)
-            y = height - 250
-
-            measurements_info = [
-                ("Shoulder Angle", last_measurement.shoulder_angle, 5),
-                ("Hip Angle", last_measurement.hip_angle, 5),
-                ("Frame Tilt", last_measurement.tilt_angle, 2)
-            ]
-
-            for label, value, threshold in measurements_info:
-                # Color code logic
-                if abs(value) <= threshold:
-                    color = '#52c41a'    # green
-                elif abs(value) <= threshold * 2:
-                    color = '#faad14'  # orange
-                else:
-                    color = '#f5222d'  # red
-
-                # Convert hex color -> RGB
-                r = int(color[1:3], 16) / 255.0
-                g = int(color[3:5], 16) / 255.0
-                b = int(color[5:7], 16) / 255.0
-                p.setFillColorRGB(r, g, b)
-
-                p.drawString(70, y, f"{label}: {value:.1f}°")
-                y -= 20
-
-            # History section
-            if len(captured_measurements) > 1:
-                p.showPage()
-
-                # Redraw logos on the new page
-                try:
-                    p.drawImage(hhn_logo, 50, height - 100, width=100, height=80, mask='auto')
-                    p.drawImage(unity_logo, width - 120, height - 80, width=70, height=60, mask='auto')
-                except Exception as e:
-                    logger.error(f"Error loading logos on second page: {e}")
-
-                p.setFont("Helvetica-Bold", 16)
-                p.drawString(50, height - 150, "Measurement History")
-                p.setFont("Helvetica", 12)
-                y = height - 180
-
-                # Show all measurements in history
-                for m in captured_measurements:
-                    try:
-                        dt = parse_timestamp(m.timestamp)
-                        timestamp_str = dt.strftime('%Y-%m-%d %H:%M:%S')
-                    except Exception as e:
-                        logger.error(f"Error parsing timestamp in generate_report: {e}")
-                        continue
-
-                    status = "Good" if (
-                        abs(m.shoulder_angle) <= 5 and
-                        abs(m.hip_angle) <= 5 and
-                        abs(m.tilt_angle) <= 2
-                    ) else "Needs Attention"
-
-                    # Draw the text
-                    p.drawString(
-                        70,
-                        y,
-                        f"Time: {timestamp_str} - Status: {status} | "
-                        f"Shoulder: {m.shoulder_angle:.1f}° | "
-                        f"Hip: {m.hip_angle:.1f}° | "
-                        f"Tilt: {m.tilt_angle:.1f}°"
-                    )
-                    y -= 20
-
-                    # Paginate if out of space
-                    if y < 50:
-                        p.showPage()
-                        p.setFont("Helvetica", 12)
-                        y = height - 50
-
-        p.save()
-        buffer.seek(0)
-
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name = f'scoliosis_analysis_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
-            mimetype='application/pdf'
+    try:
+        filename = f'scoliosis_analysis_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+        # The server closes the body when the response is done, which deletes the file
+        return Response(
+            body,
+            mimetype='application/pdf',
+            headers={
+                'Content-Disposition': f'attachment; filename={filename}',
+                'Content-Length': str(os.path.getsize(body.path))
+            }
         )
     except Exception as e:
+        body.close()
         logger.error(f"Error generating report: {e}")
         return jsonify({'error': str(e)}), 500
 
+def report_job_response(job):
+    data = job.to_dict()
+    data['status_url'] = f'/reports/{job.id}'
+    data['download_url'] = f'/reports/{job.id}/download' if job.status == 'done' else None
+    return data
+
+@app.route('/reports', methods=['POST'])
+def create_report():
+    """
+    Start rendering a report in the background, e.g.
+      { "from": "2024-01-01T00:00:00", "limit": 500 }
+    All fields are optional. Poll status_url until the job is done, then fetch download_url.
+    """
+    try:
+        params = parse_report_params(request.json or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job = get_report_jobs().submit(params)
+        return jsonify(report_job_response(job)), 200 if job.status == 'done' else 202
+    except Exception as e:
+        logger.error(f"Error creating report job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/reports/<job_id>')
+def report_status(job_id):
+    job = get_report_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown report job: {job_id}"}), 404
+    return jsonify(report_job_response(job))
+
+@app.route('/reports/<job_id>/download')
+def download_report(job_id):
+    job = get_report_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown report job: {job_id}"}), 404
+    if job.status != 'done':
+        return jsonify({'error': f"Report is not ready: {job.status}"}), 409
+    jobs = get_report_jobs()
+    try:
+        path = jobs.acquire(job)
+    except FileNotFoundError:
+        # Removed from the cache in the meantime; the client has to create a new job
+        return jsonify({'error': "Report expired, please generate it again"}), 410
+
+    try:
+        filename = f'scoliosis_analysis_{datetime.fromtimestamp(job.finished).strftime("%Y%m%d_%H%M%S")}.pdf'
+        response = send_file(path, as_attachment=True, download_name=filename, mimetype='application/pdf')
+        # The cache is not pruned of this file until the download is done. send_file
+        # responses pass their body straight to the server, which skips call_on_close
+        # callbacks, so the release is chained to closing the body itself
+        response.response = ClosingIterator(response.response, lambda: jobs.release(path))
+        return response
+    except Exception as e:
+        jobs.release(path)
+        logger.error(f"Error sending report: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ------------------------------------------------------------------
 # NEW: Route to list camera indices for the user
 # ------------------------------------------------------------------
 @app.route('/camera_list')
 def camera_list():
     """
-    List available camera indices on this machine.
+    List the video capture devices on this machine with their resolutions and frame rates.
+    Served from the device registry, which does not open the cameras. ?refresh=1 checks
+    for new devices right away instead of waiting for the hotplug watcher.
     """
-    cam = get_camera()
-    indices = cam.list_camera_indices(max_test=5)
-    return jsonify({"available_indices": indices})
+    try:
+        registry = get_default_registry()
+        if request.args.get('refresh') in ('1', 'true'):
+            registry.refresh()
+        devices = registry.capture_devices()
+        return jsonify({
+            "available_indices": [device.index for device in devices],
+            "devices": [device.to_dict() for device in devices]
+        })
+    except Exception as e:
+        logger.error(f"Error listing cameras: {e}")
+        return jsonify({'error': str(e)}), 500
 
 # ------------------------------------------------------------------
 # NEW: Route to select a camera type/index
@@ -362,6 +713,8 @@ def select_camera():
     Switch camera type or index based on user input.
     Example JSON payload:
       { "camera_type": "usb_camera", "camera_index": 1 }
+      { "camera_type": "file", "source": "session.mp4" }
+    File sources are names of recordings in RECORDINGS_DIR (see resolve_recording).
     """
     data = request.json
     if not data:
@@ -369,21 +722,35 @@ def select_camera():
     
     new_type = data.get("camera_type", "pc_camera")
     new_index = data.get("camera_index", None)
+    new_source = None
+    if new_type == 'file':
+        try:
+            new_source = resolve_recording(data.get("source"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
     global camera
     try:
-        # If an existing camera instance exists, delete it so we can recreate
-        if camera is not None:
-            del camera
-            camera = None
-
-        # Create a fresh camera with the new settings
-        camera = Camera(camera_type=new_type, camera_index=new_index, test_mode=False)
+        # Only one switch at a time, and get_camera() waits until the new camera is set
+        with camera_lock:
+            # The old camera has to let go of the device (including a bring-up that may
+            # still be opening it) before the new one opens it
+            if camera is not None:
+                old_camera = camera
+                camera = None
+                run_blocking(old_camera.close)
+
+            # Create a fresh camera with the new settings
+            new_camera = Camera(camera_type=new_type, camera_index=new_index, test_mode=False, source=new_source,
+                                background_init=True)
+            new_camera.start()
+            camera = new_camera
         logger.info(f"Switched to {new_type} at index {new_index} successfully.")
         
         return jsonify({
             "camera_type": new_type,
             "camera_index": new_index,
+            "source": data.get("source") if new_type == 'file' else None,
             "message": "Camera selection updated. Check /video_feed"
         })
     except Exception as e:
@@ -394,6 +761,8 @@ def select_camera():
 def handle_connect():
     try:
         logger.info("Client connected")
+        measurement_emitter.add_client(request.sid)
+        start_measurement_emitter()
         emit('connection_status', {'status': 'connected'})
     except Exception as e:
         logger.error(f"Error in handle_connect: {e}")
@@ -403,23 +772,77 @@ def handle_connect():
 def handle_disconnect(sid):
     try:
         logger.info(f"Client disconnected: {sid}")
+        frame_streamer.unsubscribe(request.sid)
+        measurement_emitter.remove_client(request.sid)
+        pose_clients.discard(request.sid)
     except Exception as e:
         logger.error(f"Error in handle_disconnect: {e}")
 
+@socketio.on('start_frame_stream')
+def handle_start_frame_stream():
+    """
+    Send this client the video as 'frame' messages (JPEG plus measurements). The client
+    acknowledges each frame; until then newer frames are skipped for it.
+    """
+    try:
+        get_camera()
+        frame_streamer.subscribe(request.sid)
+    except Exception as e:
+        logger.error(f"Error starting frame stream: {e}")
+        emit('error', {'error': str(e)})
+
+@socketio.on('stop_frame_stream')
+def handle_stop_frame_stream():
+    try:
+        frame_streamer.unsubscribe(request.sid)
+    except Exception as e:
+        logger.error(f"Error stopping frame stream: {e}")
+
+@socketio.on('start_pose_stream')
+def handle_start_pose_stream():
+    """
+    Send this client a 'pose' event (landmarks, angles, threshold status) for every frame.
+    """
+    try:
+        join_room(POSE_ROOM)
+        pose_clients.add(request.sid)
+        start_measurement_emitter()
+    except Exception as e:
+        logger.error(f"Error starting pose stream: {e}")
+        emit('error', {'error': str(e)})
+
+@socketio.on('stop_pose_stream')
+def handle_stop_pose_stream():
+    try:
+        leave_room(POSE_ROOM)
+        pose_clients.discard(request.sid)
+    except Exception as e:
+        logger.error(f"Error stopping pose stream: {e}")
+
 @socketio.on_error_default
 def default_error_handler(e):
     logger.error(f"SocketIO error: {str(e)}")
     emit('error', {'error': str(e)})
 
 if __name__ == '__main__':
+    # Bring the camera up while the server starts instead of on the first request. With the
+    # debug reloader only the serving child process (WERKZEUG_RUN_MAIN) may open the device.
+    if ASYNC_MODE == 'gevent' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_camera()
+    STARTUP.mark('server_starting')
     try:
-        socketio.run(
-            app,
-            host='0.0.0.0',
-            port=5005,
-            debug=True,
-            allow_unsafe_werkzeug=True
-        )
+        if ASYNC_MODE == 'gevent':
+            # gevent WSGI server; no debugger or reloader in production
+            logger.info("Starting production server (gevent)")
+            socketio.run(app, host='0.0.0.0', port=5005)
+        else:
+            socketio.run(
+                app,
+                host='0.0.0.0',
+                port=5005,
+                debug=True,
+                allow_unsafe_werkzeug=True
+            )
     except Exception as e:
         logger.error(f"Failed to start server: {e}")
 
@@ -0,0 +1,270 @@
+"""
+Benchmark the posture pipeline on recorded video or a directory of images.
+
+Drives Camera.process_frame and/or PostureDetector.process_frame frame by frame and
+reports per-stage latency percentiles, throughput and peak memory as JSON, e.g.
+
+    python benchmark.py --source recording.mp4 --profile low-latency --output results.json
+    python benchmark.py --source frames/ --target camera --baseline results.json
+
+With --baseline the run is compared with an earlier result file and the command
+exits with status 1 when the median frame time got slower than the tolerance.
+"""
+import argparse
+import json
+import logging
+import platform
+import resource
+import sys
+import time
+import cv2
+import mediapipe as mp
+import numpy as np
+from camera import Camera, PERFORMANCE_PROFILES
+from frame_encoder import FrameEncoder
+from measurement_store import MeasurementStore
+from sources import open_source
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 95, 99)
+TARGETS = ('camera', 'detector')
+
+
+class StageSamples:
+    """
+    Collect the duration of every call of each pipeline stage.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self.recording = True
+
+    def add(self, stage, seconds):
+        if self.recording:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, function):
+        """
+        Return function wrapped so that each call is recorded as the given stage.
+        """
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+        return timed
+
+    def summary(self):
+        result = {}
+        for stage, values in self.samples.items():
+            ms = np.asarray(values) * 1000.0
+            stats = {
+                'count': int(len(ms)),
+                'mean_ms': round(float(ms.mean()), 3),
+                'max_ms': round(float(ms.max()), 3)
+            }
+            for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+                stats[f'p{p}_ms'] = round(float(value), 3)
+            result[stage] = stats
+        return result
+
+
+def iter_frames(source, samples, max_frames=None, loops=1):
+    """
+    Yield BGR frames from a video file or a directory of images, recording the
+    read/decode time of each frame as the 'decode' stage.
+    """
+    count = 0
+    for _ in range(loops):
+        frames = open_source(source)
+        try:
+            while True:
+                started = time.perf_counter()
+                ret, frame = frames.read()
+                if not ret:
+                    break
+                samples.add('decode', time.perf_counter() - started)
+                yield frame
+                count += 1
+                if max_frames and count >= max_frames:
+                    return
+        finally:
+            frames.release()
+
+
+def create_camera_runner(args, samples):
+    """
+    Camera.process_frame with its stages (inference, smoothing, tilt, angles, draw) timed.
+    """
+    camera = Camera(test_mode=True, profile=args.profile, tilt_mode=args.tilt_mode,
+                    roi_tracking=not args.no_roi, smoothing=not args.no_smoothing,
+                    store=MeasurementStore(':memory:'))
+    camera.detect_landmarks = samples.wrap('inference', camera.detect_landmarks)
+    camera.smooth_landmarks = samples.wrap('smoothing', camera.smooth_landmarks)
+    camera.estimate_frame_tilt = samples.wrap('tilt', camera.estimate_frame_tilt)
+    camera.analyze_landmarks = samples.wrap('angles', camera.analyze_landmarks)
+    camera.render_frame = samples.wrap('draw', camera.render_frame)
+    return camera.process_frame
+
+
+def create_detector_runner(args, samples):
+    """
+    PostureDetector.process_frame with its stages (inference, angles, draw) timed.
+    """
+    from posture_detection import PostureDetector
+
+    detector = PostureDetector(profile=args.profile)
+    detector.pose.process = samples.wrap('inference', detector.pose.process)
+    detector._calculate_measurements = samples.wrap('angles', detector._calculate_measurements)
+    detector._draw_annotations = samples.wrap('draw', detector._draw_annotations)
+
+    def run(frame):
+        # PostureDetector draws into its input
+        return detector.process_frame(frame.copy())
+    return run
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0, 1)
+
+
+def run_target(target, args):
+    """
+    Run one target over the source and return its results.
+    """
+    samples = StageSamples()
+    runner = create_camera_runner(args, samples) if target == 'camera' else create_detector_runner(args, samples)
+    profile = PERFORMANCE_PROFILES[args.profile]
+    encoder = FrameEncoder(quality=profile.jpeg_quality, stream_width=profile.stream_width, skip_unchanged=False)
+    encode = samples.wrap('encode', encoder.encode)
+
+    frames = 0
+    detected = 0
+    started = None
+    samples.recording = args.warmup <= 0
+    for index, frame in enumerate(iter_frames(args.source, samples, max_frames=args.max_frames, loops=args.loops)):
+        # Warm-up frames run through the pipeline but are not part of the statistics
+        samples.recording = index >= args.warmup
+        if samples.recording and started is None:
+            started = time.perf_counter()
+
+        frame_started = time.perf_counter()
+        output, measurements = runner(frame)
+        encode(output)
+        samples.add('total', time.perf_counter() - frame_started)
+
+        if samples.recording:
+            frames += 1
+            detected += measurements is not None
+
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    stages = samples.summary()
+    total_mean = stages.get('total', {}).get('mean_ms')
+    return {
+        'frames': frames,
+        'pose_detected': detected,
+        'elapsed_s': round(elapsed, 3),
+        # Including decode, as a deployment reading the same source would see it
+        'fps': round(frames / elapsed, 2) if elapsed > 0 else None,
+        # Processing only (process_frame + encode)
+        'processing_fps': round(1000.0 / total_mean, 2) if total_mean else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare the median frame time of each target with a baseline result.
+
+    :return: List of regression messages (empty if none).
+    """
+    regressions = []
+    for target, result in results['results'].items():
+        old = baseline.get('results', {}).get(target, {}).get('stages', {}).get('total')
+        new = result['stages'].get('total')
+        if not old or not new:
+            continue
+        change = new['p50_ms'] / old['p50_ms'] - 1.0
+        logger.info(f"{target}: median frame time {old['p50_ms']:.1f} ms -> {new['p50_ms']:.1f} ms ({change:+.1%})")
+        if change > tolerance:
+            regressions.append(f"{target}: median frame time {old['p50_ms']:.1f} ms -> "
+                               f"{new['p50_ms']:.1f} ms ({change:+.1%}, tolerance {tolerance:.0%})")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the posture pipeline on recorded frames.")
+    parser.add_argument('--source', required=True, help="Video file or directory of images")
+    parser.add_argument('--target', choices=TARGETS + ('both',), default='both',
+                        help="Pipeline to drive: Camera, PostureDetector or both")
+    parser.add_argument('--profile', choices=list(PERFORMANCE_PROFILES.keys()), default='balanced',
+                        help="Performance profile (Pose model, JPEG quality)")
+    parser.add_argument('--tilt-mode', choices=('adaptive', 'per_frame'), default='adaptive')
+    parser.add_argument('--no-roi', action='store_true', help="Disable ROI tracking in Camera")
+    parser.add_argument('--no-smoothing', action='store_true', help="Disable landmark smoothing in Camera")
+    parser.add_argument('--max-frames', type=int, default=None, help="Stop after this many frames")
+    parser.add_argument('--loops', type=int, default=1, help="Repeat the source this many times")
+    parser.add_argument('--warmup', type=int, default=5, help="Frames excluded from the statistics")
+    parser.add_argument('--output', help="Write the JSON results to this file instead of stdout")
+    parser.add_argument('--baseline', help="Earlier JSON result to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="Allowed slowdown of the median frame time against the baseline (0.1 = 10%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+    args = parse_args(argv)
+    targets = TARGETS if args.target == 'both' else (args.target,)
+
+    results = {
+        'source': args.source,
+        'settings': {
+            'profile': args.profile,
+            'tilt_mode': args.tilt_mode,
+            'roi_tracking': not args.no_roi,
+            'smoothing': not args.no_smoothing,
+            'warmup': args.warmup,
+            'loops': args.loops,
+            'max_frames': args.max_frames
+        },
+        'platform': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'opencv': cv2.__version__,
+            'mediapipe': mp.__version__,
+            'numpy': np.__version__
+        },
+        'created': time.time(),
+        'results': {}
+    }
+    # Peak RSS is per process: with --target both the second value includes the first target
+    for target in targets:
+        logger.info(f"Benchmarking {target} on {args.source}")
+        results['results'][target] = run_target(target, args)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        logger.info(f"Results written to {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            logger.error(f"Regression: {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
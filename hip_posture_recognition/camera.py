@@ -1,5 +1,4 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 from dataclasses import dataclass
 import logging
@@ -7,45 +6,163 @@ import json
 import os
 import time
 import math
+import threading
+from pipeline import LatestQueue, StageTimer, KeyframeScheduler, LandmarkPredictor, OneEuroFilter, is_new_frame
+from tilt_estimation import TiltEstimator
+from roi_tracking import RoiTracker
+from frame_encoder import FrameEncoder
+from sources import open_source
+from device_registry import get_default_registry
+from measurement_store import get_default_store
+from models import PostureMeasurements, PostureThresholds
+from metrics import (FRAMES_CAPTURED, FRAMES_CAPTURE_FAILED, FRAMES_PROCESSED, INFERENCE_LATENCY,
+                     TILT_LATENCY, ENCODE_LATENCY, TEST_MODE_FALLBACKS)
 
 logger = logging.getLogger(__name__)
 
+# Outputs of the encode stage that viewers register for (Camera.add_viewer)
+VIEWER_KINDS = ('annotated', 'raw')
+
+# Seconds between placeholder frames while the camera is brought up in the background
+PLACEHOLDER_INTERVAL = 0.5
+
 @dataclass
-class PostureMeasurements:
-    shoulder_angle: float
-    hip_angle: float
-    tilt_angle: float
-    timestamp: float = None
+class PerformanceProfile:
+    model_complexity: int = 1
+    min_detection_confidence: float = 0.5
+    min_tracking_confidence: float = 0.5
+    static_image_mode: bool = False
+    width: int = 640
+    height: int = 480
+    fps: int = 30
+    jpeg_quality: int = 80
+    stream_width: int = None  # Downscale the video stream to this width (None = capture width)
+    raw_jpeg_quality: int = 40  # Raw video under a client-drawn overlay (/video_feed/raw)
+    raw_fps: int = 6
+
+# Named trade-offs between speed and accuracy for different hardware
+PERFORMANCE_PROFILES = {
+    'low-latency': PerformanceProfile(model_complexity=0, width=320, height=240, jpeg_quality=70),
+    'balanced': PerformanceProfile(),
+    'accurate': PerformanceProfile(model_complexity=2, width=1280, height=720, jpeg_quality=90)
+}
+
+def create_pose(profile, smooth_landmarks=True):
+    """
+    Build a MediaPipe Pose graph with the model settings of a performance profile.
+    MediaPipe is imported here rather than at module level: it is the slowest import
+    of the application (~1 s) and only needed once the camera is brought up.
+
+    :param smooth_landmarks: MediaPipe's own temporal landmark filter. Off for graphs fed
+                             with crops that move between frames.
+    """
+    import mediapipe as mp
+
+    return mp.solutions.pose.Pose(
+        static_image_mode=profile.static_image_mode,
+        smooth_landmarks=smooth_landmarks,
+        min_detection_confidence=profile.min_detection_confidence,
+        min_tracking_confidence=profile.min_tracking_confidence,
+        model_complexity=profile.model_complexity
+    )
 
 @dataclass
-class PostureThresholds:
-    shoulder_threshold: float = 5.0
-    hip_threshold: float = 5.0
-    tilt_threshold: float = 2.0
+class PoseAnalysis:
+    landmarks: np.ndarray = None          # (33, 4) float32: x, y, z in pixels and visibility
+    measurements: PostureMeasurements = None
+    frame_tilt: float = None
+    connection_angles: np.ndarray = None  # Normalized angle per custom connection
+    connection_exceeded: np.ndarray = None  # True where the angle is above its threshold
+
+    def overlay_signature(self):
+        """
+        Everything render_frame draws from this analysis, as a comparable value.
+        """
+        def raw(array):
+            return None if array is None else array.tobytes()
+        return (self.frame_tilt, self.measurements is not None, raw(self.landmarks),
+                raw(self.connection_angles), raw(self.connection_exceeded))
+
+def landmarks_to_array(pose_landmarks, width, height):
+    """
+    Convert MediaPipe pose landmarks into a (33, 4) float32 array holding
+    x, y and z in pixels (z scaled by the image width, like x) and the visibility.
+
+    :param width: Width of the image the landmarks were detected in (the crop for ROI inference).
+    """
+    landmarks = np.array(
+        [(lm.x, lm.y, lm.z, lm.visibility) for lm in pose_landmarks.landmark],
+        dtype=np.float32
+    )
+    landmarks *= np.array([width, height, width, 1.0], dtype=np.float32)
+    return landmarks
 
 class Camera:
-    def __init__(self, camera_type='pc_camera', camera_index=None, test_mode=False):
+    def __init__(self, camera_type='pc_camera', camera_index=None, test_mode=False, tilt_mode='adaptive',
+                 roi_tracking=True, profile='balanced', frame_skipping=True, smoothing=True, store=None,
+                 source=None, background_init=False):
         """
         Initialize the camera object.
 
-        :param camera_type: 'pc_camera' or 'usb_camera'.
+        :param camera_type: 'pc_camera', 'usb_camera' or 'file'.
         :param camera_index: An integer specifying the device index if known.
         :param test_mode: If True, do not attempt to open any real camera (generates test frames).
+        :param tilt_mode: 'adaptive' to cache the frame tilt and recompute it on a downscaled image
+                          only every few frames or on camera motion, 'per_frame' to run the full
+                          resolution Hough transform on every frame.
+        :param roi_tracking: If True, run pose inference on a crop around the body found
+                             in the previous frame and fall back to the full frame when it is lost.
+        :param profile: Name of the performance profile ('low-latency', 'balanced' or 'accurate').
+        :param frame_skipping: If True, run pose inference only on every Nth frame (N adapts to the
+                               inference time) and stream the frames in between with the last
+                               landmarks extrapolated, so the video keeps the full camera rate.
+        :param smoothing: If True, filter the landmark coordinates over time (One-Euro filter)
+                          before the angles are computed, to stop the angles from jittering.
+        :param store: MeasurementStore for captured measurements (defaults to the shared SQLite store).
+        :param source: Video file, stream URL (e.g. rtsp://) or image directory for camera_type 'file'.
+                       It is replayed in a loop at its own frame rate.
+        :param background_init: If True, return at once and build the Pose graph, run a warm-up
+                                inference and open the camera in a background thread. Until that
+                                is done the pipeline shows a placeholder frame.
         """
         self.video = None
         self.camera_type = camera_type
         self.camera_index = camera_index
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            min_detection_confidence=0.5,
-            model_complexity=1
-        )
+        self.source = source
+        self.tilt_mode = tilt_mode
+        self.tilt_estimator = TiltEstimator()
+        self.roi_tracking = roi_tracking
+        self.roi_tracker = RoiTracker()
+        self.frame_skipping = frame_skipping
+        self.keyframe_scheduler = KeyframeScheduler()
+        self.landmark_predictor = LandmarkPredictor()
+        self.smoothing = smoothing
+        self.landmark_filter = OneEuroFilter()
+        if profile not in PERFORMANCE_PROFILES:
+            raise ValueError(f"Unknown performance profile: {profile}")
+        self.profile_name = profile
+        self.profile = PERFORMANCE_PROFILES[profile]
+        # Full-frame graph, and a separate graph for ROI crops (see detect_landmarks)
+        self.pose = None
+        self.roi_pose = None
+        self._last_graph = None
+        # True until the background bring-up (see _bring_up) has finished
+        self.starting = background_init
+        self.bring_up_timings = {}
+        self._bring_up_thread = None
+        # Set by close(): a bring-up still running gives up instead of opening the device
+        self._closing = threading.Event()
+        self._placeholder_frame = None
+        # Guards the Pose graph (swapped by profile changes) and the capture device settings
+        self._pose_lock = threading.Lock()
+        self._video_lock = threading.Lock()
         self.custom_connections = [
             (11, 12),  # Shoulder
             (13, 14),  # Hip
             (23, 24)   # Knee
         ]
+        self._connection_starts = np.array([c[0] for c in self.custom_connections])
+        self._connection_ends = np.array([c[1] for c in self.custom_connections])
         self.RED = (0, 0, 255)
         self.GREEN = (0, 255, 0)
         self.PINK = (255, 105, 180)
@@ -53,8 +170,42 @@ class Camera:
         self.thresholds = self.load_thresholds()
         self.test_mode = test_mode
         self.frame_count = 0
-        self.captured_measurements = []
-
+        self.store = store if store is not None else get_default_store()
+
+        # Latest-frame slot shared by all viewers, filled by a single producer thread
+        self.target_fps = self.profile.fps
+        self.encoder = FrameEncoder(quality=self.profile.jpeg_quality, stream_width=self.profile.stream_width)
+        self.raw_encoder = FrameEncoder(quality=self.profile.raw_jpeg_quality, stream_width=self.profile.stream_width)
+        self._frame_condition = threading.Condition()
+        self._frame_id = 0
+        self._latest_frame = None
+        self._latest_analysis = None
+        self._latest_frame_size = None
+        self._raw_frame_id = 0
+        self._latest_raw_frame = None
+        self._last_raw_at = 0.0
+        self._frame_listeners = []
+        # Only outputs somebody watches are produced (see add_viewer)
+        self._viewer_counts = {kind: 0 for kind in VIEWER_KINDS}
+        self._pipeline_threads = []
+        self._running = False
+
+        # Pipeline stages (grab -> inference -> annotate+encode) joined by "latest wins" queues
+        self._inference_queue = LatestQueue('inference')
+        self._encode_queue = LatestQueue('encode')
+        self.stage_timers = {
+            'capture': StageTimer('capture'),
+            'inference': StageTimer('inference'),
+            'encode': StageTimer('encode'),
+            'latency': StageTimer('latency')
+        }
+
+        if background_init:
+            self._bring_up_thread = threading.Thread(target=self._bring_up, name="camera-bring-up", daemon=True)
+            self._bring_up_thread.start()
+            return
+
+        self.pose, self.roi_pose = self._create_graphs(self.profile)
         # If not in test mode, try to open the camera
         if not self.test_mode:
             time.sleep(0.5)  # Small delay before initialization
@@ -62,23 +213,70 @@ class Camera:
         else:
             logger.info("Starting in test mode")
 
+    def _bring_up(self):
+        """
+        Build the Pose graph, run a warm-up inference and open the camera (background_init).
+        The first inference of a new graph initializes the model and is several times slower
+        than the following ones; doing it here keeps it out of the first streamed frames.
+        """
+        started = time.perf_counter()
+
+        def record(step):
+            self.bring_up_timings[step] = round(time.perf_counter() - started, 3)
+
+        try:
+            profile = self.profile
+            graphs = self._create_graphs(profile)
+            record('pose_created')
+            for graph in graphs:
+                if graph is not None:
+                    graph.process(np.zeros((profile.height, profile.width, 3), dtype=np.uint8))
+            record('pose_warmed_up')
+            with self._pose_lock:
+                if self.pose is None:
+                    self.pose, self.roi_pose = graphs
+                    graphs = ()
+            # Not installed if the profile was switched during bring-up and brought its own graphs
+            self._close_graphs(graphs)
+
+            if self._closing.is_set():
+                logger.info("Camera closed during bring-up, not opening the device")
+            elif self.test_mode:
+                logger.info("Starting in test mode")
+            else:
+                self.try_init_camera()
+                record('camera_failed' if self.test_mode else 'camera_opened')
+        except Exception as e:
+            logger.error(f"Error bringing up camera: {e}")
+            self.test_mode = True
+            TEST_MODE_FALLBACKS.inc()
+        finally:
+            self.starting = False
+            logger.info(f"Camera bring-up finished: {self.bring_up_timings} (test mode: {self.test_mode})")
+
+    def generate_placeholder_frame(self):
+        """
+        JPEG shown while the camera is being brought up (encoded once).
+        """
+        if self._placeholder_frame is None:
+            frame = np.full((self.profile.height, self.profile.width, 3), 32, dtype=np.uint8)
+            cv2.putText(frame, "Starting camera...", (20, self.profile.height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                        1, (255, 255, 255), 2)
+            ret, jpeg = cv2.imencode('.jpg', frame)
+            if not ret:
+                raise Exception("Failed to encode placeholder frame")
+            self._placeholder_frame = FrameEncoder.wrap(jpeg)
+        return self._placeholder_frame
+
     def list_camera_indices(self, max_test=5):
         """
-        Enumerate camera indices that can be opened successfully.
-        Returns a list of indices (e.g. [0, 1]) you can then pick from.
+        Return the indices of the video capture devices (e.g. [0, 2]) you can then pick from.
+        They come from the device registry, so no camera is opened.
 
-        :param max_test: How many indices to test (0..max_test-1).
-        :return: A list of valid camera indices.
+        :param max_test: Only report indices below this value.
+        :return: A list of camera indices.
         """
-        available_indices = []
-        for i in range(max_test):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                ret, frame = cap.read()
-                if ret and frame is not None:
-                    available_indices.append(i)
-                cap.release()
-        return available_indices
+        return [device.index for device in get_default_registry().capture_devices() if device.index < max_test]
 
     def load_thresholds(self):
         """
@@ -137,13 +335,18 @@ class Camera:
 
     def try_init_camera(self):
         """
-        Attempt to initialize either a PC camera or a USB camera.
+        Attempt to initialize a PC camera, a USB camera or a recorded source ('file').
         If it fails after several retries, fall back to test_mode.
         """
         max_retries = 3
         retry_count = 0
+        self.tilt_estimator.reset()
+        self.roi_tracker.reset()
+        self.keyframe_scheduler.reset()
+        self.landmark_predictor.reset()
+        self.landmark_filter.reset()
 
-        while retry_count < max_retries:
+        while retry_count < max_retries and not self._closing.is_set():
             try:
                 # If there's an existing camera open, release it
                 if self.video:
@@ -151,12 +354,15 @@ class Camera:
                     time.sleep(1)
 
                 if self.camera_type == 'pc_camera':
-                    # If a user-specified index is set, try that first
-                    index_to_try = self.camera_index if self.camera_index is not None else 0
+                    # If a user-specified index is set, try that first, else the first capture device
+                    index_to_try = self.camera_index
+                    if index_to_try is None:
+                        devices = get_default_registry().capture_devices()
+                        index_to_try = devices[0].index if devices else 0
                     logger.info(f"Attempting to open PC camera at index {index_to_try}...")
                     self.video = cv2.VideoCapture(index_to_try)
                     if self.video.isOpened():
-                        self._configure_camera_settings()
+                        self._configure_camera_settings(self.profile.width, self.profile.height, self.profile.fps)
                         ret, frame = self.video.read()
                         if ret and frame is not None:
                             logger.info(f"Successfully initialized PC camera at index {index_to_try}")
@@ -165,14 +371,15 @@ class Camera:
                     raise Exception("Could not initialize PC camera")
 
                 elif self.camera_type == 'usb_camera':
+                    registry = get_default_registry()
                     # If a user-specified index is set, try that first
                     if self.camera_index is not None:
                         logger.info(f"Attempting to open USB camera at index {self.camera_index}...")
                         self.video = cv2.VideoCapture(self.camera_index)
                         if self.video.isOpened():
                             # Attempt different resolutions
-                            for resolution in [(640, 480), (1280, 720), (800, 600)]:
-                                self._configure_camera_settings(*resolution)
+                            for resolution in self._candidate_resolutions(registry.get(self.camera_index)):
+                                self._configure_camera_settings(*resolution, fps=self.profile.fps)
                                 ret, frame = self.video.read()
                                 if ret and frame is not None:
                                     logger.info(f"Successfully initialized USB camera at index {self.camera_index} "
@@ -185,14 +392,17 @@ class Camera:
                             logger.warning(f"Failed to read a valid frame from USB camera at index {self.camera_index}. "
                                            "Will fallback to scanning all indices...")
 
-                    # Fallback: scan indices 0..3 with multiple resolutions
+                    # Fallback: try the other capture devices of the registry
                     found_camera = False
-                    for i in range(4):
-                        logger.info(f"Attempting to open USB camera at index {i}...")
+                    for device in registry.capture_devices():
+                        i = device.index
+                        if i == self.camera_index:
+                            continue
+                        logger.info(f"Attempting to open USB camera at index {i} ({device.name or device.path})...")
                         self.video = cv2.VideoCapture(i)
                         if self.video.isOpened():
-                            for resolution in [(640, 480), (1280, 720), (800, 600)]:
-                                self._configure_camera_settings(*resolution)
+                            for resolution in self._candidate_resolutions(device):
+                                self._configure_camera_settings(*resolution, fps=self.profile.fps)
                                 ret, frame = self.video.read()
                                 if ret and frame is not None:
                                     logger.info(f"Successfully initialized USB camera on index {i} "
@@ -212,25 +422,138 @@ class Camera:
 
                     return  # If found_camera is True, we've already returned
 
+                elif self.camera_type == 'file':
+                    if not self.source:
+                        raise Exception("No source given for file camera")
+                    logger.info(f"Opening recorded source {self.source}...")
+                    self.video = open_source(self.source, loop=True, realtime=True)
+                    ret, frame = self.video.read()
+                    if ret and frame is not None:
+                        logger.info(f"Successfully opened recorded source {self.source}")
+                        self.test_mode = False
+                        return
+                    raise Exception(f"Could not read a frame from {self.source}")
+
             except Exception as e:
                 logger.error(f"Camera initialization attempt {retry_count + 1} failed: {e}")
                 retry_count += 1
-                time.sleep(2)
+                self._closing.wait(2)
 
+        if self._closing.is_set():
+            return
         logger.warning("All camera initialization attempts failed, falling back to test mode.")
         self.test_mode = True
+        TEST_MODE_FALLBACKS.inc()
+
+    @property
+    def mirrored(self):
+        """
+        Live camera frames are flipped horizontally for a mirrored view; recordings are not.
+        """
+        return self.camera_type != 'file'
 
-    def _configure_camera_settings(self, width=640, height=480):
+    def _configure_camera_settings(self, width=640, height=480, fps=30):
         """
         Configure common OpenCV camera settings for convenience, 
         including width, height, FPS, and buffer size.
+        Recordings (camera_type 'file') are replayed as they are and skipped.
         """
-        if self.video:
+        if self.video and self.camera_type != 'file':
             self.video.set(cv2.CAP_PROP_FRAME_WIDTH, width)
             self.video.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-            self.video.set(cv2.CAP_PROP_FPS, 30)
+            self.video.set(cv2.CAP_PROP_FPS, fps)
             self.video.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
+    def _candidate_resolutions(self, device=None):
+        """
+        Resolutions to try when opening a USB camera, starting with the one of the active profile.
+
+        :param device: VideoDevice from the registry; resolutions it does not offer are left out.
+        """
+        resolutions = [(self.profile.width, self.profile.height)]
+        for resolution in [(640, 480), (1280, 720), (800, 600)]:
+            if resolution not in resolutions:
+                resolutions.append(resolution)
+        if device is not None:
+            supported = [resolution for resolution in resolutions if device.supports(*resolution)]
+            # A camera without any of them still gets its driver's nearest match for the profile
+            resolutions = supported or resolutions[:1]
+        return resolutions
+
+    def _create_graphs(self, profile):
+        """
+        :return: (full-frame Pose graph, ROI crop graph or None without ROI tracking).
+        """
+        roi_pose = create_pose(profile, smooth_landmarks=False) if self.roi_tracking else None
+        return create_pose(profile), roi_pose
+
+    @staticmethod
+    def _close_graphs(graphs):
+        for graph in graphs:
+            try:
+                if graph is not None:
+                    graph.close()
+            except Exception as e:
+                logger.error(f"Error closing previous pose graph: {e}")
+
+    def set_performance_profile(self, name):
+        """
+        Switch to another performance profile at runtime: build a new Pose graph,
+        swap it in between two inferences and reconfigure the capture resolution.
+
+        :param name: 'low-latency', 'balanced' or 'accurate'.
+        :return: The activated PerformanceProfile.
+        """
+        if name not in PERFORMANCE_PROFILES:
+            raise ValueError(f"Unknown performance profile: {name}")
+        profile = PERFORMANCE_PROFILES[name]
+
+        # Build the new graphs before taking the lock so inference only pauses for the swap
+        new_graphs = self._create_graphs(profile)
+        # Configure the device before anything is swapped, so a failure leaves the old profile in place
+        if not self.test_mode:
+            try:
+                with self._video_lock:
+                    self._configure_camera_settings(profile.width, profile.height, profile.fps)
+            except Exception:
+                self._close_graphs(new_graphs)
+                raise
+        with self._pose_lock:
+            old_graphs = (self.pose, self.roi_pose)
+            self.pose, self.roi_pose = new_graphs
+            self._last_graph = None
+            self.profile_name = name
+            self.profile = profile
+            self.target_fps = profile.fps
+            self.encoder.configure(quality=profile.jpeg_quality, stream_width=profile.stream_width)
+            self.raw_encoder.configure(quality=profile.raw_jpeg_quality, stream_width=profile.stream_width)
+            self.roi_tracker.reset()
+            self.keyframe_scheduler.reset()
+            self.landmark_filter.reset()
+        self._close_graphs(old_graphs)
+
+        if not self.test_mode:
+            self.tilt_estimator.reset()
+
+        for timer in self.stage_timers.values():
+            timer.reset()
+        logger.info(f"Switched to performance profile '{name}'")
+        return profile
+
+    def measure_performance(self, duration=2.0):
+        """
+        Measure the published frame rate and average latencies over the next few seconds.
+        """
+        start_id = self._frame_id
+        started = time.time()
+        time.sleep(duration)
+        elapsed = time.time() - started
+        return {
+            'fps': round((self._frame_id - start_id) / elapsed, 2),
+            'latency_ms': self.stage_timers['latency'].snapshot()['avg_ms'],
+            'inference_ms': self.stage_timers['inference'].snapshot()['avg_ms']
+        }
+
     def __del__(self):
         """
         Clean up the camera resource when the object is destroyed.
@@ -293,6 +616,8 @@ class Camera:
         Process it to produce posture measurements and return
         both the JPEG image bytes and the measurements (if any).
         """
+        if self.starting:
+            return self.generate_placeholder_frame().jpeg.tobytes(), None
         if self.test_mode:
             return self.generate_test_frame()
 
@@ -300,14 +625,19 @@ class Camera:
             success, frame = self.video.read()
             if not success or frame is None:
                 logger.error("Failed to capture frame")
+                FRAMES_CAPTURE_FAILED.inc()
+                TEST_MODE_FALLBACKS.inc()
                 self.test_mode = True
                 return self.generate_test_frame()
+            FRAMES_CAPTURED.inc()
 
             # Flip frame horizontally for a mirrored view
-            frame = cv2.flip(frame, 1)
+            if self.mirrored:
+                frame = cv2.flip(frame, 1)
             processed_frame, measurements = self.process_frame(frame)
 
-            ret, jpeg = cv2.imencode('.jpg', processed_frame)
+            with ENCODE_LATENCY.time():
+                ret, jpeg = cv2.imencode('.jpg', processed_frame)
             if not ret:
                 raise Exception("Failed to encode frame")
 
@@ -318,15 +648,392 @@ class Camera:
             # Fallback to test frame on error
             return self.generate_test_frame()
 
+    def start(self):
+        """
+        Start the pipeline threads that capture, process and encode frames
+        into the latest-frame slot. Calling it again while running is a no-op.
+        """
+        with self._frame_condition:
+            if self._running:
+                return
+            self._running = True
+            self._inference_queue.reopen()
+            self._encode_queue.reopen()
+            self._pipeline_threads = [
+                threading.Thread(target=loop, name=f"camera-{name}", daemon=True)
+                for name, loop in (
+                    ('grab', self._grab_loop),
+                    ('inference', self._inference_loop),
+                    ('encode', self._encode_loop)
+                )
+            ]
+            for thread in self._pipeline_threads:
+                thread.start()
+            logger.info("Camera pipeline started")
+
+    def stop(self, timeout=2.0):
+        """
+        Stop the pipeline threads and wake up any viewers waiting for a frame.
+        """
+        with self._frame_condition:
+            self._running = False
+            self._frame_condition.notify_all()
+        self._inference_queue.close()
+        self._encode_queue.close()
+        for thread in self._pipeline_threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._pipeline_threads = []
+
+    def close(self, timeout=2.0):
+        """
+        Shut the camera down for good so another Camera can open the device: cancel a
+        running bring-up (waiting for a device open in progress), stop the pipeline and
+        release the device.
+        """
+        self._closing.set()
+        if self._bring_up_thread is not None and self._bring_up_thread is not threading.current_thread():
+            self._bring_up_thread.join()
+        self.stop(timeout)
+        self.__del__()
+
+    def _grab_loop(self):
+        """
+        Grab stage: read frames from the device as fast as it delivers them.
+        Frames the inference stage has not picked up yet are replaced, not queued.
+        With frame skipping, only keyframes go to inference and every frame goes
+        straight to the encode stage.
+        """
+        while self._running:
+            started = time.time()
+            try:
+                if self.starting:
+                    # The placeholder is static: a couple of frames per second keep viewers alive
+                    encoded = self.generate_placeholder_frame()
+                    if self._viewer_counts['raw'] > 0:
+                        self._publish_raw_frame(encoded)
+                    self._publish_frame(encoded, PoseAnalysis())
+                    time.sleep(PLACEHOLDER_INTERVAL)
+                    continue
+
+                if self.test_mode:
+                    # Test frames carry their own measurements and skip the pipeline
+                    frame, measurements = self.generate_test_frame()
+                    encoded = FrameEncoder.wrap(frame)
+                    if self._viewer_counts['raw'] > 0:
+                        self._publish_raw_frame(encoded)
+                    self._publish_frame(encoded, PoseAnalysis(measurements=measurements))
+                    remaining = (1.0 / self.target_fps) - (time.time() - started)
+                    if remaining > 0:
+                        time.sleep(remaining)
+                    continue
+
+                with self.stage_timers['capture'].time(), self._video_lock:
+                    success, frame = self.video.read()
+                    if success and frame is not None and self.mirrored:
+                        # Flip frame horizontally for a mirrored view
+                        frame = cv2.flip(frame, 1)
+
+                if not success or frame is None:
+                    logger.error("Failed to capture frame")
+                    FRAMES_CAPTURE_FAILED.inc()
+                    TEST_MODE_FALLBACKS.inc()
+                    self.test_mode = True
+                    continue
+
+                FRAMES_CAPTURED.inc()
+                captured_at = time.time()
+                if not self.frame_skipping:
+                    self._inference_queue.put((captured_at, frame))
+                    continue
+
+                self.keyframe_scheduler.record_frame(captured_at)
+                if self.keyframe_scheduler.is_keyframe():
+                    self._inference_queue.put((captured_at, frame))
+                # No analysis yet: the encode stage predicts it from the last keyframes
+                self._encode_queue.put((captured_at, frame, None))
+
+            except Exception as e:
+                logger.error(f"Error in grab stage: {e}")
+                time.sleep(0.1)
+
+    def _inference_loop(self):
+        """
+        Inference stage: run pose detection and angle calculation on the newest grabbed frame.
+        """
+        while self._running:
+            item = self._inference_queue.get()
+            if item is None:
+                continue
+            captured_at, frame = item
+            try:
+                started = time.perf_counter()
+                analysis = self.analyze_frame(frame, captured_at)
+                duration = time.perf_counter() - started
+                self.stage_timers['inference'].record(duration)
+                INFERENCE_LATENCY.observe(duration)
+                FRAMES_PROCESSED.inc()
+
+                if self.frame_skipping:
+                    self.keyframe_scheduler.record_inference(duration)
+                    self.landmark_predictor.update(captured_at, analysis.landmarks, analysis.frame_tilt)
+                else:
+                    self._encode_queue.put((captured_at, frame, analysis))
+            except Exception as e:
+                logger.error(f"Error in inference stage: {e}")
+
+    def _encode_loop(self):
+        """
+        Annotate+encode stage: draw the overlay and JPEG-encode the newest analyzed frame.
+        The annotated frame is only produced while somebody watches it; clients that draw
+        the overlay themselves get the analysis and a raw frame at raw_fps instead.
+        """
+        while self._running:
+            item = self._encode_queue.get()
+            if item is None:
+                continue
+            captured_at, frame, analysis = item
+            try:
+                if analysis is None:
+                    analysis = self.predict_analysis(captured_at)
+                with self.stage_timers['encode'].time():
+                    encoded = None
+                    if self._viewer_counts['annotated'] > 0:
+                        output_image = self.render_frame(frame, analysis)
+                        # The capture time identifies the source frame
+                        encoded = self.encoder.encode(output_image,
+                                                      key=(captured_at, analysis.overlay_signature()))
+                        if encoded is None:
+                            raise Exception("Failed to encode frame")
+                    if self._viewer_counts['raw'] > 0 and \
+                            captured_at - self._last_raw_at >= 1.0 / self.profile.raw_fps:
+                        raw = self.raw_encoder.encode(frame, key=captured_at)
+                        if raw is not None:
+                            self._last_raw_at = captured_at
+                            self._publish_raw_frame(raw)
+                self._publish_frame(encoded, analysis, (frame.shape[1], frame.shape[0]))
+                self.stage_timers['latency'].record(time.time() - captured_at)
+            except Exception as e:
+                logger.error(f"Error in encode stage: {e}")
+
+    def predict_analysis(self, timestamp):
+        """
+        Build the analysis of a frame that skipped inference from the landmarks
+        of the last keyframes, predicted to the frame's capture time.
+        """
+        landmarks, frame_tilt = self.landmark_predictor.predict(timestamp)
+        if landmarks is None:
+            return PoseAnalysis(frame_tilt=frame_tilt)
+        return self.analyze_landmarks(landmarks, frame_tilt)
+
+    def get_pipeline_stats(self):
+        """
+        Return per-stage timings and the number of frames dropped between stages.
+        """
+        return {
+            'running': self._running,
+            'starting': self.starting,
+            'test_mode': self.test_mode,
+            'bring_up': dict(self.bring_up_timings),
+            'frames_published': self._frame_id,
+            'frames_encoded': self.encoder.encoded_count,
+            'encodes_skipped': self.encoder.skipped_count,
+            'raw_frames_encoded': self.raw_encoder.encoded_count,
+            'viewers': dict(self._viewer_counts),
+            'frame_skipping': self.frame_skipping,
+            'inference_interval': self.keyframe_scheduler.interval if self.frame_skipping else 1,
+            'stages': {name: timer.snapshot() for name, timer in self.stage_timers.items()},
+            'dropped': {
+                queue.name: queue.dropped_count
+                for queue in (self._inference_queue, self._encode_queue)
+            }
+        }
+
+    def _publish_frame(self, frame, analysis, frame_size=None):
+        """
+        Store a new frame in the latest-frame slot and wake up all waiting viewers.
+
+        :param frame: Annotated EncodedFrame, or None if nobody watches the annotated video.
+        :param analysis: PoseAnalysis of the frame (only measurements for test frames).
+        :param frame_size: (width, height) of the analyzed frame, the landmark coordinate space.
+        """
+        with self._frame_condition:
+            self._frame_id += 1
+            self._latest_frame = frame
+            self._latest_analysis = analysis
+            self._latest_frame_size = frame_size
+            self._frame_condition.notify_all()
+            frame_id = self._frame_id
+            listeners = list(self._frame_listeners)
+        self._notify_listeners(frame_id, listeners)
+
+    def _publish_raw_frame(self, frame):
+        """
+        Store a new EncodedFrame without overlay in the raw frame slot.
+        """
+        with self._frame_condition:
+            self._raw_frame_id += 1
+            self._latest_raw_frame = frame
+            self._frame_condition.notify_all()
+            frame_id = self._raw_frame_id
+            listeners = list(self._frame_listeners)
+        self._notify_listeners(frame_id, listeners)
+
+    def _notify_listeners(self, frame_id, listeners):
+        for listener in listeners:
+            try:
+                listener(frame_id)
+            except Exception as e:
+                logger.error(f"Error in frame listener: {e}")
+
+    def add_frame_listener(self, listener):
+        """
+        Call listener(frame_id) from the pipeline thread whenever a new frame is published.
+        Listeners must return quickly; they are used to wake up viewers that cannot block
+        on the frame condition (e.g. greenlets in the gevent server mode).
+        """
+        with self._frame_condition:
+            self._frame_listeners.append(listener)
+
+    def remove_frame_listener(self, listener):
+        with self._frame_condition:
+            if listener in self._frame_listeners:
+                self._frame_listeners.remove(listener)
+
+    def add_viewer(self, kind):
+        """
+        Register a consumer of an output: 'annotated' (video with overlay) or 'raw'
+        (video without overlay). Outputs without viewers are not rendered or encoded.
+        """
+        with self._frame_condition:
+            self._viewer_counts[kind] += 1
+
+    def remove_viewer(self, kind):
+        with self._frame_condition:
+            self._viewer_counts[kind] = max(0, self._viewer_counts[kind] - 1)
+
+    def latest_frame(self):
+        """
+        Return the latest annotated frame without waiting.
+
+        :return: Tuple (frame_id, encoded_frame, measurements); encoded_frame is None
+                 before the first frame or while the annotated video has no viewers.
+        """
+        with self._frame_condition:
+            measurements = self._latest_analysis.measurements if self._latest_analysis else None
+            return self._frame_id, self._latest_frame, measurements
+
+    def latest_pose(self):
+        """
+        Return the analysis of the latest frame without waiting.
+
+        :return: Tuple (frame_id, analysis, frame_size); analysis is None before the first frame.
+        """
+        with self._frame_condition:
+            return self._frame_id, self._latest_analysis, self._latest_frame_size
+
+    def latest_raw_frame(self):
+        """
+        Return the latest frame without overlay without waiting.
+
+        :return: Tuple (raw_frame_id, encoded_frame); encoded_frame is None before the first one.
+        """
+        with self._frame_condition:
+            return self._raw_frame_id, self._latest_raw_frame
+
+    def _wait_for(self, read, last_frame_id, timeout):
+        with self._frame_condition:
+            self._frame_condition.wait_for(lambda: is_new_frame(read(), last_frame_id), timeout=timeout)
+            result = read()
+            if not is_new_frame(result, last_frame_id):
+                return (last_frame_id,) + (None,) * (len(result) - 1)
+            return result
+
+    def wait_for_frame(self, last_frame_id=None, timeout=1.0):
+        """
+        Block until an annotated frame newer than last_frame_id is available.
+
+        :param last_frame_id: The id of the last frame the caller has seen.
+        :param timeout: Maximum seconds to wait for a new frame.
+        :return: Tuple (frame_id, encoded_frame, measurements). encoded_frame is an
+                 EncodedFrame, or None on timeout.
+        """
+        return self._wait_for(self.latest_frame, last_frame_id, timeout)
+
+    def wait_for_pose(self, last_frame_id=None, timeout=1.0):
+        """
+        Block until the analysis of a frame newer than last_frame_id is available.
+
+        :return: Tuple (frame_id, analysis, frame_size); analysis is None on timeout.
+        """
+        return self._wait_for(self.latest_pose, last_frame_id, timeout)
+
+    def wait_for_raw_frame(self, last_frame_id=None, timeout=1.0):
+        """
+        Block until a frame without overlay newer than last_frame_id is available.
+
+        :return: Tuple (raw_frame_id, encoded_frame); encoded_frame is None on timeout.
+        """
+        return self._wait_for(self.latest_raw_frame, last_frame_id, timeout)
+
+    def describe_pose(self, analysis, frame_size):
+        """
+        Compact description of the overlay for clients that draw it themselves:
+        the points, angle and threshold status of every custom connection and the
+        end of the correction line, in the pixel coordinates of the analyzed frame.
+        """
+        pose = {
+            'width': frame_size[0] if frame_size else None,
+            'height': frame_size[1] if frame_size else None,
+            'frame_tilt': round(float(analysis.frame_tilt), 2) if analysis.frame_tilt is not None else None,
+            'measurements': None,
+            'connections': []
+        }
+        if analysis.measurements is not None:
+            pose['measurements'] = {
+                'shoulder_angle': round(analysis.measurements.shoulder_angle, 2),
+                'hip_angle': round(analysis.measurements.hip_angle, 2),
+                'tilt_angle': round(analysis.measurements.tilt_angle, 2)
+            }
+        if analysis.landmarks is None or analysis.connection_angles is None:
+            return pose
+
+        points = np.trunc(analysis.landmarks[:, :2]).astype(np.int32)
+        for i, (start, end) in enumerate(self.custom_connections):
+            point1 = tuple(points[start].tolist())
+            point2 = tuple(points[end].tolist())
+            exceeded = bool(analysis.connection_exceeded[i])
+            correction = None
+            if exceeded and analysis.frame_tilt is not None:
+                new_x, new_y = self.rotate_2d(point1, point2, point1[0], point1[1], analysis.frame_tilt)
+                correction = [int(new_x), int(new_y)]
+            pose['connections'].append({
+                'points': [list(point1), list(point2)],
+                'angle': round(float(analysis.connection_angles[i]), 1),
+                'exceeded': exceeded,
+                'correction': correction
+            })
+        return pose
+
+    def estimate_frame_tilt(self, frame):
+        """
+        Return the frame tilt according to tilt_mode: the cached adaptive estimate
+        or a full Hough transform of this frame.
+        """
+        if self.tilt_mode == 'adaptive':
+            return self.tilt_estimator.update(frame)
+        return self.calculate_frame_tilt(frame)
+
     def calculate_frame_tilt(self, frame):
         """
         Estimate the tilt of the entire frame by detecting dominant lines via Hough transform.
         Returns an angle in degrees, or None if no lines are found.
         """
         try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-            lines = cv2.HoughLines(edges, 1, np.pi / 180, 200)
+            with TILT_LATENCY.labels('per_frame').time():
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+                lines = cv2.HoughLines(edges, 1, np.pi / 180, 200)
 
             if lines is not None:
                 angles = []
@@ -416,99 +1123,206 @@ class Camera:
             return test_frame, test_meas
 
         try:
-            output_image = frame.copy()
-            imageRGB = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.pose.process(imageRGB)
-            height, width, _ = frame.shape
-            landmarks = []
-            measurements = None
-
-            # Calculate the tilt of the entire frame
-            frame_tilt = self.calculate_frame_tilt(frame)
-            if frame_tilt is not None:
-                cv2.putText(
-                    output_image,
-                    f"Frame Tilt: {frame_tilt:.2f}",
-                    (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    1,
-                    (255, 255, 255),
-                    2,
-                    cv2.LINE_AA
-                )
-
-            if results.pose_landmarks:
-                for landmark in results.pose_landmarks.landmark:
-                    landmarks.append((
-                        int(landmark.x * width),
-                        int(landmark.y * height),
-                        (landmark.z * width)
-                    ))
-
-                # 11,12 => Shoulders, 13,14 => Hips
-                shoulder_points = (landmarks[11][:2], landmarks[12][:2])
-                hip_points = (landmarks[13][:2], landmarks[14][:2])
-
-                # Calculate angles
-                shoulder_angle = self.calculate_horizontal_angle(shoulder_points[0], shoulder_points[1])
-                hip_angle = self.calculate_horizontal_angle(hip_points[0], hip_points[1])
-
-                # Subtract frame tilt if available
-                if frame_tilt is not None:
-                    shoulder_angle -= frame_tilt
-                    hip_angle -= frame_tilt
-
-                # Normalize to 0-180, flipping if >90
-                shoulder_angle = abs(shoulder_angle) % 180
-                if shoulder_angle > 90:
-                    shoulder_angle = 180 - shoulder_angle
-
-                hip_angle = abs(hip_angle) % 180
-                if hip_angle > 90:
-                    hip_angle = 180 - hip_angle
-
-                # If frame_tilt is None, approximate tilt as average of angles
-                tilt_angle = frame_tilt if frame_tilt is not None else (shoulder_angle + hip_angle) / 2
-
-                measurements = PostureMeasurements(
-                    shoulder_angle=float(shoulder_angle),
-                    hip_angle=float(hip_angle),
-                    tilt_angle=float(tilt_angle)
-                )
-
-                # Draw lines, angles, etc.
-                self._draw_enhanced_pose(output_image, landmarks, measurements, frame_tilt)
-
-            return output_image, measurements
+            with INFERENCE_LATENCY.time():
+                analysis = self.analyze_frame(frame)
+            FRAMES_PROCESSED.inc()
+            output_image = self.render_frame(frame, analysis)
+            return output_image, analysis.measurements
 
         except Exception as e:
             logger.error(f"Error processing frame: {e}")
             return frame, None
 
-    def _draw_enhanced_pose(self, image, landmarks, measurements, frame_tilt):
+    def analyze_frame(self, frame, timestamp=None):
+        """
+        Run MediaPipe Pose detection and frame tilt estimation on a frame
+        and compute the posture angles. Does not modify the frame.
+
+        :param timestamp: Capture time of the frame, used by the landmark smoothing filter.
+        :return: A PoseAnalysis with pixel landmarks, measurements and frame tilt.
+        """
+        landmarks = self.detect_landmarks(frame)
+        if self.smoothing:
+            landmarks = self.smooth_landmarks(landmarks, timestamp if timestamp is not None else time.time())
+
+        # Tilt of the entire frame (cached between estimations in adaptive mode)
+        frame_tilt = self.estimate_frame_tilt(frame)
+
+        if landmarks is None:
+            return PoseAnalysis(frame_tilt=frame_tilt)
+
+        return self.analyze_landmarks(landmarks, frame_tilt)
+
+    def smooth_landmarks(self, landmarks, timestamp):
+        """
+        Filter the x, y, z landmark coordinates over time. The filter restarts
+        when the pose is lost, so a new person does not blend with the previous one.
+        """
+        if landmarks is None:
+            self.landmark_filter.reset()
+            return None
+        smoothed = landmarks.copy()
+        smoothed[:, :3] = self.landmark_filter(landmarks[:, :3], timestamp)
+        return smoothed
+
+    def detect_landmarks(self, frame):
+        """
+        Run MediaPipe Pose on the frame and return the landmarks in full-frame pixels.
+        With roi_tracking enabled, inference runs on a crop around the previous
+        detection and falls back to the full frame when the person is not found in it.
+
+        Crops and full frames go to separate graphs, so MediaPipe's tracking state never
+        mixes the two coordinate systems. The crop graph has MediaPipe's landmark smoothing
+        off (the crop moves between frames); smoothing happens in full-frame pixels in
+        smooth_landmarks instead.
+
+        :return: (33, 4) landmark array, or None if no pose was detected.
+        """
+        region = self.roi_tracker.get_region(frame.shape) if self.roi_tracking else None
+        landmarks = None
+
+        if region is not None:
+            landmarks = self._detect_in_region(frame, region, is_crop=True)
+            if landmarks is None:
+                logger.debug("Lost ROI tracking, retrying on the full frame")
+
+        if landmarks is None:
+            height, width = frame.shape[:2]
+            landmarks = self._detect_in_region(frame, (0, 0, width, height), is_crop=False)
+
+        if self.roi_tracking:
+            self.roi_tracker.update(landmarks)
+        return landmarks
+
+    def _detect_in_region(self, frame, region, is_crop):
+        """
+        Run pose inference on one region of the frame, optionally downscaled,
+        and map the landmarks back to full-frame pixel coordinates.
+
+        :param is_crop: True for an ROI crop (crop graph), False for the full frame.
+        """
+        x0, y0, x1, y1 = region
+        crop = frame[y0:y1, x0:x1]
+        crop_width, crop_height = x1 - x0, y1 - y0
+
+        scale = self.roi_tracker.inference_scale(crop_width)
+        if scale < 1.0:
+            crop = cv2.resize(crop, (int(crop_width * scale), int(crop_height * scale)),
+                              interpolation=cv2.INTER_AREA)
+
+        imageRGB = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        with self._pose_lock:
+            graph = self.roi_pose if is_crop else self.pose
+            if self._last_graph is not None and self._last_graph is not graph:
+                # Its tracking state is from frames before the last switch between crop and full frame
+                graph.reset()
+            self._last_graph = graph
+            results = graph.process(imageRGB)
+        if not results.pose_landmarks:
+            return None
+
+        # Normalized crop coordinates -> full-frame pixels. MediaPipe scales z like x, relative
+        # to the width of its input image, so the crop width gives z in full-frame pixels too
+        landmarks = landmarks_to_array(results.pose_landmarks, crop_width, crop_height)
+        landmarks[:, 0] += x0
+        landmarks[:, 1] += y0
+        return landmarks
+
+    def analyze_landmarks(self, landmarks, frame_tilt):
+        """
+        Compute the angles and threshold status of every custom connection in one
+        vectorized pass and derive the posture measurements from them.
+
+        :param landmarks: (33, 4) landmark array in pixel coordinates.
+        :param frame_tilt: Frame tilt in degrees, or None.
+        :return: A PoseAnalysis.
+        """
+        angles, exceeded = self.compute_connection_angles(landmarks, frame_tilt)
+
+        # Connection 0 => Shoulders (11,12), connection 1 => Hips (13,14)
+        shoulder_angle = float(angles[0])
+        hip_angle = float(angles[1])
+
+        # If frame_tilt is None, approximate tilt as average of angles
+        tilt_angle = frame_tilt if frame_tilt is not None else (shoulder_angle + hip_angle) / 2
+
+        measurements = PostureMeasurements(
+            shoulder_angle=shoulder_angle,
+            hip_angle=hip_angle,
+            tilt_angle=float(tilt_angle)
+        )
+
+        return PoseAnalysis(
+            landmarks=landmarks,
+            measurements=measurements,
+            frame_tilt=frame_tilt,
+            connection_angles=angles,
+            connection_exceeded=exceeded
+        )
+
+    def compute_connection_angles(self, landmarks, frame_tilt):
+        """
+        Vectorized version of calculate_horizontal_angle plus tilt correction and
+        normalization for all custom connections at once.
+
+        :return: Tuple (angles, exceeded) of arrays with one entry per custom connection.
+        """
+        # Pixel coordinates are truncated like the int() conversion used for drawing
+        points = np.trunc(landmarks[:, :2]).astype(np.float64)
+        delta = points[self._connection_starts] - points[self._connection_ends]
+        angles = np.degrees(np.arctan2(delta[:, 1], delta[:, 0]))
+        # Normalize angle into -180 to 180
+        angles = (angles + 360) % 360 - 180
+
+        # Subtract frame tilt if available
+        if frame_tilt is not None:
+            angles -= frame_tilt
+
+        # Normalize to 0-180, flipping if >90
+        angles = np.abs(angles) % 180
+        angles = np.where(angles > 90, 180 - angles, angles)
+
+        # Shoulder, hip, and tilt threshold for every other connection
+        thresholds = np.full(len(self.custom_connections), self.thresholds.tilt_threshold)
+        thresholds[0] = self.thresholds.shoulder_threshold
+        thresholds[1] = self.thresholds.hip_threshold
+        return angles, angles > thresholds
+
+    def render_frame(self, frame, analysis):
+        """
+        Draw the frame tilt and the pose overlay of an analysis onto a copy of the frame.
+        """
+        output_image = frame.copy()
+        if analysis.frame_tilt is not None:
+            cv2.putText(
+                output_image,
+                f"Frame Tilt: {analysis.frame_tilt:.2f}",
+                (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                1,
+                (255, 255, 255),
+                2,
+                cv2.LINE_AA
+            )
+
+        if analysis.measurements is not None:
+            # Draw lines, angles, etc.
+            self._draw_enhanced_pose(output_image, analysis)
+
+        return output_image
+
+    def _draw_enhanced_pose(self, image, analysis):
         """
         Draw circles, lines, angle annotations, and reference lines for corrections.
+        Uses the connection angles and threshold status computed in analyze_landmarks.
         """
         try:
-            for connection in self.custom_connections:
-                point1 = landmarks[connection[0]][:2]
-                point2 = landmarks[connection[1]][:2]
-
-                # Calculate angle for this connection
-                angle = self.calculate_horizontal_angle(point1, point2)
-                if frame_tilt is not None:
-                    angle -= frame_tilt
-                angle = abs(angle) % 180
-                if angle > 90:
-                    angle = 180 - angle
-
-                # Determine threshold based on connection
-                if connection == (11, 12):  # Shoulder
-                    threshold = self.thresholds.shoulder_threshold
-                elif connection == (13, 14):  # Hip
-                    threshold = self.thresholds.hip_threshold
-                else:
-                    threshold = self.thresholds.tilt_threshold
+            frame_tilt = analysis.frame_tilt
+            points = np.trunc(analysis.landmarks[:, :2]).astype(np.int32)
+            for i, connection in enumerate(self.custom_connections):
+                point1 = tuple(points[connection[0]].tolist())
+                point2 = tuple(points[connection[1]].tolist())
+                angle = float(analysis.connection_angles[i])
 
                 # Draw angle text near the midpoint
                 mid_x = (point1[0] + point2[0]) // 2
@@ -524,7 +1338,7 @@ class Camera:
                 )
 
                 # Color and lines
-                if abs(angle) > threshold:
+                if analysis.connection_exceeded[i]:
                     cv2.circle(image, point1, 10, self.RED, -1)
                     cv2.circle(image, point2, 10, self.RED, -1)
                     cv2.line(image, point1, point2, self.RED, 2)
@@ -542,15 +1356,21 @@ class Camera:
         except Exception as e:
             logger.error(f"Error drawing enhanced pose: {e}")
 
-    def set_camera_type(self, camera_type):
+    def set_camera_type(self, camera_type, source=None):
         """
         Change the camera type at runtime. This will release the existing camera and attempt a new init.
-        :param camera_type: 'pc_camera' or 'usb_camera'
+        :param camera_type: 'pc_camera', 'usb_camera' or 'file'
+        :param source: Recording to replay for camera_type 'file'.
         """
-        if camera_type != self.camera_type:
+        if camera_type != self.camera_type or source != self.source:
+            was_running = self._running
+            self.stop()  # The producer thread must not read while the device is swapped
             self.camera_type = camera_type
+            self.source = source
             self.__del__()  # Release current camera
             self.try_init_camera()
+            if was_running:
+                self.start()
 
     def capture_measurement(self, data):
         """
@@ -563,9 +1383,7 @@ class Camera:
                 tilt_angle=float(data['tilt_angle']),
                 timestamp=time.time()
             )
-            self.get_measurements_history()  # Load existing from file
-            self.captured_measurements.insert(0, measurement)  # Insert newest at front
-            self.save_measurements()  # Save all
+            self.store.append(measurement)  # Single append, independent of history size
             return {
                 'success': True,
                 'measurement': {
@@ -579,78 +1397,22 @@ class Camera:
             logger.error(f"Error capturing measurement: {e}")
             return {'success': False, 'error': str(e)}
 
-    def get_measurements_history(self):
-        """
-        Return all captured measurements (loaded from captured_measurements.json if present).
+    def get_measurements_page(self, start=None, end=None, limit=50, after=None):
         """
-        try:
-            measurements_path = os.path.join(os.path.dirname(__file__), 'captured_measurements.json')
-            if os.path.exists(measurements_path):
-                with open(measurements_path, 'r') as f:
-                    data = json.load(f)
-                    self.captured_measurements = []
-                    for m in data:
-                        try:
-                            measurement = PostureMeasurements(
-                                shoulder_angle=float(m['shoulder_angle']),
-                                hip_angle=float(m['hip_angle']),
-                                tilt_angle=float(m['tilt_angle']),
-                                timestamp=float(m['timestamp'])
-                            )
-                            self.captured_measurements.append(measurement)
-                        except Exception as e:
-                            logger.error(f"Error converting measurement: {e}")
-
-            # Sort newest first by timestamp
-            return sorted(self.captured_measurements, key=lambda x: x.timestamp, reverse=True)
-
-        except Exception as e:
-            logger.error(f"Error loading measurements history: {e}")
-            return self.captured_measurements
+        Return one page of captured measurements, newest first.
+        See MeasurementStore.page for the parameters.
 
-    def save_measurements(self):
-        """
-        Save the in-memory measurements to a JSON file (atomic replace).
+        :return: (list of (id, PostureMeasurements), key of the next page or None)
         """
-        measurements_path = None
-        temp_path = None
-        try:
-            measurements_path = os.path.join(os.path.dirname(__file__), 'captured_measurements.json')
-            temp_path = measurements_path + '.tmp'
-
-            data = []
-            for m in self.captured_measurements:
-                data.append({
-                    'shoulder_angle': float(m.shoulder_angle),
-                    'hip_angle': float(m.hip_angle),
-                    'tilt_angle': float(m.tilt_angle),
-                    'timestamp': float(m.timestamp) if m.timestamp else time.time()
-                })
-
-            with open(temp_path, 'w') as f:
-                json.dump(data, f, indent=2)
-
-            os.replace(temp_path, measurements_path)
-
-        except Exception as e:
-            logger.error(f"Error saving measurements: {e}")
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
+        return self.store.page(start=start, end=end, limit=limit, after=after)
 
     def clear_measurements(self):
         """
-        Clear all captured measurements from memory and remove the JSON file.
+        Clear all captured measurements from the store.
         """
         try:
-            self.captured_measurements = []
-            measurements_path = os.path.join(os.path.dirname(__file__), 'captured_measurements.json')
-            if os.path.exists(measurements_path):
-                os.remove(measurements_path)
+            self.store.clear()
             return True
         except Exception as e:
             logger.error(f"Error clearing measurements: {e}")
             return False
-
@@ -0,0 +1,358 @@
+import os
+import re
+import struct
+import threading
+import logging
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+SYSFS_VIDEO4LINUX = '/sys/class/video4linux'
+
+# Seconds between two looks at the device list for plugged or unplugged cameras
+HOTPLUG_POLL_INTERVAL = 2.0
+
+# Indices probed with OpenCV where there is no video4linux (e.g. macOS, Windows)
+PROBE_INDICES = 5
+
+# Sizes offered for cameras that report a size range instead of a list
+COMMON_RESOLUTIONS = ((320, 240), (640, 480), (800, 600), (1280, 720), (1920, 1080))
+
+
+def _ioc(direction, number, size):
+    return (direction << 30) | (size << 16) | (ord('V') << 8) | number
+
+
+# struct v4l2_capability, v4l2_fmtdesc, v4l2_frmsizeenum and v4l2_frmivalenum of <linux/videodev2.h>
+_CAPABILITY = struct.Struct('16s32s32sIII12x')
+_FMTDESC = struct.Struct('III32sII12x')
+_FRMSIZE = struct.Struct('IIIIIIIII8x')
+_FRMIVAL = struct.Struct('IIIIIIIIIII8x')
+
+VIDIOC_QUERYCAP = _ioc(2, 0, _CAPABILITY.size)
+VIDIOC_ENUM_FMT = _ioc(3, 2, _FMTDESC.size)
+VIDIOC_ENUM_FRAMESIZES = _ioc(3, 74, _FRMSIZE.size)
+VIDIOC_ENUM_FRAMEINTERVALS = _ioc(3, 75, _FRMIVAL.size)
+
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_FRMSIZE_TYPE_DISCRETE = 1
+V4L2_FRMIVAL_TYPE_DISCRETE = 1
+
+
+@dataclass
+class VideoMode:
+    pixel_format: str  # FourCC, e.g. 'MJPG' or 'YUYV'
+    width: int
+    height: int
+    fps: list = field(default_factory=list)  # Frame rates, highest first (empty if not reported)
+
+    def to_dict(self):
+        return {'format': self.pixel_format, 'width': self.width, 'height': self.height, 'fps': self.fps}
+
+
+@dataclass
+class VideoDevice:
+    index: int  # OpenCV capture index (N of /dev/videoN)
+    path: str
+    name: str = ''
+    bus_info: str = ''
+    capture: bool = None  # None if the capabilities could not be queried
+    modes: list = field(default_factory=list)
+
+    def supports(self, width, height):
+        """
+        :return: True if the camera offers this resolution, or if its modes are unknown.
+        """
+        if not self.modes:
+            return True
+        return any(mode.width == width and mode.height == height for mode in self.modes)
+
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'path': self.path,
+            'name': self.name,
+            'bus_info': self.bus_info,
+            'modes': [mode.to_dict() for mode in self.modes]
+        }
+
+
+def _text(raw):
+    return raw.split(b'\0', 1)[0].decode('utf-8', 'replace').strip()
+
+
+def _fourcc(code):
+    return ''.join(chr((code >> shift) & 0xff) for shift in (0, 8, 16, 24)).strip()
+
+
+def _enumerate(fd, request, layout, *fields):
+    """
+    Yield the unpacked results of an enumeration ioctl for index 0, 1, ... until the driver says EINVAL.
+    """
+    import fcntl
+
+    index = 0
+    while True:
+        # The leading fields are all 32 bit: the index, then the request parameters
+        buffer = bytearray(layout.size)
+        struct.pack_into(f'{1 + len(fields)}I', buffer, 0, index, *fields)
+        try:
+            fcntl.ioctl(fd, request, buffer)
+        except OSError:
+            return
+        yield layout.unpack(buffer)
+        index += 1
+
+
+def _frame_rates(fd, pixel_format, width, height):
+    rates = []
+    for values in _enumerate(fd, VIDIOC_ENUM_FRAMEINTERVALS, _FRMIVAL, pixel_format, width, height):
+        interval_type, numerator, denominator = values[4], values[5], values[6]
+        if interval_type != V4L2_FRMIVAL_TYPE_DISCRETE:
+            # Continuous or stepwise: the fastest rate is the minimum interval
+            if numerator:
+                rates.append(round(denominator / numerator, 2))
+            break
+        if numerator:
+            rates.append(round(denominator / numerator, 2))
+    return sorted(set(rates), reverse=True)
+
+
+def _frame_sizes(fd, pixel_format):
+    sizes = []
+    for values in _enumerate(fd, VIDIOC_ENUM_FRAMESIZES, _FRMSIZE, pixel_format):
+        size_type = values[2]
+        if size_type == V4L2_FRMSIZE_TYPE_DISCRETE:
+            sizes.append((values[3], values[4]))
+            continue
+        # Stepwise or continuous range: min/max width, step, min/max height, step
+        min_width, max_width, step_width, min_height, max_height, step_height = values[3:9]
+        for width, height in COMMON_RESOLUTIONS:
+            if (min_width <= width <= max_width and min_height <= height <= max_height
+                    and (width - min_width) % max(step_width, 1) == 0
+                    and (height - min_height) % max(step_height, 1) == 0):
+                sizes.append((width, height))
+        break
+    return sizes
+
+
+def query_device(path):
+    """
+    Read the name, capabilities and capture modes of a V4L2 device with ioctls.
+    Opening the device node does not start streaming, so this works while another
+    process (or our own pipeline) is capturing from it.
+
+    :return: (name, bus_info, capture, modes); capture is None if the device could not be queried.
+    """
+    try:
+        import fcntl  # POSIX only
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except (ImportError, OSError) as e:
+        logger.warning(f"Could not query {path}: {e}")
+        return '', '', None, []
+
+    try:
+        buffer = bytearray(_CAPABILITY.size)
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, buffer)
+        _, card, bus_info, _, capabilities, device_caps = _CAPABILITY.unpack(buffer)
+        if capabilities & V4L2_CAP_DEVICE_CAPS:
+            capabilities = device_caps
+        capture = bool(capabilities & V4L2_CAP_VIDEO_CAPTURE)
+
+        modes = []
+        if capture:
+            for values in _enumerate(fd, VIDIOC_ENUM_FMT, _FMTDESC, V4L2_BUF_TYPE_VIDEO_CAPTURE):
+                pixel_format = values[4]
+                for width, height in _frame_sizes(fd, pixel_format):
+                    modes.append(VideoMode(_fourcc(pixel_format), width, height,
+                                           _frame_rates(fd, pixel_format, width, height)))
+        return _text(card), _text(bus_info), capture, modes
+    except OSError as e:
+        logger.warning(f"Could not query capabilities of {path}: {e}")
+        return '', '', None, []
+    finally:
+        os.close(fd)
+
+
+def probe_indices(max_test=PROBE_INDICES):
+    """
+    Find cameras by opening OpenCV indices 0..max_test-1 and reading a frame.
+    Slow and it competes with an active capture, so it is only the fallback where
+    there is no video4linux to enumerate.
+    """
+    import cv2
+
+    devices = []
+    for index in range(max_test):
+        cap = cv2.VideoCapture(index)
+        if cap.isOpened():
+            ret, frame = cap.read()
+            if ret and frame is not None:
+                devices.append(VideoDevice(index=index, path=str(index), capture=True))
+            cap.release()
+    return devices
+
+
+class DeviceRegistry:
+    """
+    Cached list of the video capture devices of this machine.
+
+    On Linux the devices are enumerated from /sys/class/video4linux and their modes
+    (pixel format, resolution, frame rates) are queried once per device with V4L2
+    ioctls, without opening a capture or reading frames. A watcher thread lists the
+    sysfs directory every few seconds and only queries devices that were plugged in
+    since. Elsewhere the OpenCV indices are probed once and on refresh().
+    """
+
+    def __init__(self, sysfs_root=SYSFS_VIDEO4LINUX, poll_interval=HOTPLUG_POLL_INTERVAL, query=query_device):
+        """
+        :param sysfs_root: The video4linux class directory.
+        :param poll_interval: Seconds between hotplug checks of the watcher thread.
+        :param query: Function returning (name, bus_info, capture, modes) for a device node.
+        """
+        self.sysfs_root = sysfs_root
+        self.poll_interval = poll_interval
+        self.query = query
+        self.generation = 0  # Incremented whenever the device list changes
+        self._devices = None
+        self._identities = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher = None
+
+    @property
+    def uses_sysfs(self):
+        return os.path.isdir(self.sysfs_root)
+
+    def _identity(self, entry):
+        # The physical device behind a node: a different camera plugged in under the same
+        # /dev/videoN name has a different identity, so its modes are queried again
+        base = os.path.join(self.sysfs_root, entry)
+        try:
+            with open(os.path.join(base, 'dev')) as f:
+                dev = f.read().strip()
+        except OSError:
+            dev = ''
+        try:
+            with open(os.path.join(base, 'name')) as f:
+                name = f.read().strip()
+        except OSError:
+            name = ''
+        return dev, name, os.path.realpath(os.path.join(base, 'device'))
+
+    def _scan_sysfs(self):
+        try:
+            entries = os.listdir(self.sysfs_root)
+        except OSError as e:
+            logger.error(f"Error listing {self.sysfs_root}: {e}")
+            entries = []
+        identities = {}
+        for entry in entries:
+            match = re.fullmatch(r'video(\d+)', entry)
+            if match:
+                identities[int(match.group(1))] = self._identity(entry)
+
+        if self._devices is not None and identities == self._identities:
+            return False
+
+        known = {device.index: device for device in (self._devices or [])}
+        devices = []
+        for index in sorted(identities):
+            device = known.get(index)
+            if device is None or self._identities.get(index) != identities[index]:
+                path = f'/dev/video{index}'
+                name, bus_info, capture, modes = self.query(path)
+                device = VideoDevice(index=index, path=path, name=name or identities[index][1],
+                                     bus_info=bus_info, capture=capture, modes=modes)
+            devices.append(device)
+
+        if self._devices is not None:
+            added = sorted(set(identities) - set(self._identities))
+            removed = sorted(set(self._identities) - set(identities))
+            logger.info(f"Video devices changed (added {added}, removed {removed})")
+        self._identities = identities
+        self._devices = devices
+        return True
+
+    def refresh(self):
+        """
+        Update the device list now. On Linux only new or replaced devices are queried;
+        without video4linux all indices are probed again.
+
+        :return: True if the device list changed.
+        """
+        with self._lock:
+            if self.uses_sysfs:
+                changed = self._scan_sysfs()
+            else:
+                devices = probe_indices()
+                changed = self._devices is None or [d.index for d in devices] != [d.index for d in self._devices]
+                self._devices = devices
+            if changed:
+                self.generation += 1
+            return changed
+
+    def devices(self):
+        """
+        :return: All known video devices, enumerated on first use.
+        """
+        if self._devices is None:
+            self.refresh()
+        return list(self._devices)
+
+    def capture_devices(self):
+        """
+        :return: Devices that can capture video, skipping metadata and output nodes
+                 (a UVC webcam usually has one of each). Devices whose capabilities
+                 could not be queried are included.
+        """
+        return [device for device in self.devices() if device.capture is not False]
+
+    def get(self, index):
+        for device in self.devices():
+            if device.index == index:
+                return device
+        return None
+
+    def start(self):
+        """
+        Start the hotplug watcher thread (only with video4linux, elsewhere refresh() has to be called).
+        """
+        if self._watcher is not None or not self.uses_sysfs:
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=self._watch, name="device-hotplug", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.poll_interval + 1)
+            self._watcher = None
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error checking for video devices: {e}")
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_default_registry():
+    """
+    Return the process-wide device registry, enumerating the devices and starting
+    the hotplug watcher on first use.
+    """
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = DeviceRegistry()
+            _default_registry.refresh()
+            _default_registry.start()
+        return _default_registry
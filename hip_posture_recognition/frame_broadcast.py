@@ -0,0 +1,87 @@
+import logging
+from pipeline import is_new_frame
+
+logger = logging.getLogger(__name__)
+
+
+class FrameBroadcaster:
+    """
+    Wakes viewers running as greenlets (gevent server mode) when the camera publishes a frame.
+
+    The camera pipeline runs in real OS threads, so greenlets must not block on its
+    frame condition: that would stall the whole event loop. Instead the pipeline thread
+    signals an async watcher of the gevent hub, which is safe to call from any thread,
+    and the hub sets a gevent Event all waiting viewers sleep on. An idle viewer is a
+    parked greenlet and costs neither a thread nor CPU time.
+
+    Offers the same wait_for_frame(), wait_for_pose() and wait_for_raw_frame() as Camera,
+    so the viewer code does not depend on the server mode. Must be created in the
+    thread running the gevent hub.
+    """
+
+    def __init__(self, camera):
+        """
+        :param camera: Camera whose published frames are broadcast.
+        """
+        import gevent
+        from gevent.event import Event
+
+        self._event_class = Event
+        self.camera = camera
+        self._event = Event()
+        self._watcher = gevent.get_hub().loop.async_()
+        self._watcher.start(self._on_frame)
+        camera.add_frame_listener(self._notify)
+
+    def _notify(self, frame_id):
+        # Pipeline thread: only signal the hub, everything else happens in the event loop
+        self._watcher.send()
+
+    def _on_frame(self):
+        # Event loop: wake everyone waiting for this frame, later waiters get a fresh event
+        event, self._event = self._event, self._event_class()
+        event.set()
+
+    def _wait(self, read, last_frame_id, timeout):
+        result = read()
+        if not is_new_frame(result, last_frame_id):
+            self._event.wait(timeout)
+            result = read()
+            if not is_new_frame(result, last_frame_id):
+                return (last_frame_id,) + (None,) * (len(result) - 1)
+        return result
+
+    def wait_for_frame(self, last_frame_id=None, timeout=1.0):
+        """
+        Wait (cooperatively) until an annotated frame newer than last_frame_id is available.
+
+        :return: Tuple (frame_id, encoded_frame, measurements) like Camera.wait_for_frame;
+                 encoded_frame is None on timeout.
+        """
+        return self._wait(self.camera.latest_frame, last_frame_id, timeout)
+
+    def wait_for_pose(self, last_frame_id=None, timeout=1.0):
+        """
+        Like Camera.wait_for_pose, without blocking the event loop.
+        """
+        return self._wait(self.camera.latest_pose, last_frame_id, timeout)
+
+    def wait_for_raw_frame(self, last_frame_id=None, timeout=1.0):
+        """
+        Like Camera.wait_for_raw_frame, without blocking the event loop.
+        """
+        return self._wait(self.camera.latest_raw_frame, last_frame_id, timeout)
+
+    def add_viewer(self, kind):
+        self.camera.add_viewer(kind)
+
+    def remove_viewer(self, kind):
+        self.camera.remove_viewer(kind)
+
+    def close(self):
+        """
+        Stop listening to the camera. Waiting viewers time out and pick up the next broadcaster.
+        """
+        self.camera.remove_frame_listener(self._notify)
+        self._watcher.stop()
+        self._watcher.close()
@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+from dataclasses import dataclass
+import logging
+from metrics import ENCODE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+MULTIPART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+MULTIPART_TRAILER = b'\r\n'
+
+
+@dataclass
+class EncodedFrame:
+    jpeg: memoryview      # Zero-copy view of the encoder output
+    multipart: bytes      # Complete multipart/x-mixed-replace part, shared by all MJPEG viewers
+
+    def __len__(self):
+        return len(self.jpeg)
+
+
+class FrameEncoder:
+    """
+    JPEG encoder for the video stream.
+
+    Encodes with a configurable quality and optional downscale (the downscaled copy
+    goes into a scratch buffer reused for every frame), and builds the multipart part
+    once per frame so MJPEG viewers only hand out the same bytes object.
+
+    The caller can pass a key naming what the image shows (the source frame and the
+    analysis drawn on it). When it equals the key of the previous frame, the previous
+    result is returned without scaling or encoding. Pixels are never compared, so a
+    small change of the overlay can not be mistaken for an unchanged frame.
+    """
+
+    def __init__(self, quality=80, stream_width=None, skip_unchanged=True):
+        """
+        :param quality: JPEG quality (0-100).
+        :param stream_width: If set, frames wider than this are downscaled before encoding.
+        :param skip_unchanged: Reuse the previous result when the key passed to encode() did not change.
+        """
+        self.quality = quality
+        self.stream_width = stream_width
+        self.skip_unchanged = skip_unchanged
+        self._resize_buffer = None
+        self._last_key = None
+        self._last_frame = None
+        self.encoded_count = 0
+        self.skipped_count = 0
+
+    def configure(self, quality=None, stream_width=None):
+        """
+        Change quality and downscale width; the next frame is always re-encoded.
+        """
+        if quality is not None:
+            self.quality = quality
+        self.stream_width = stream_width
+        self._last_key = None
+
+    def encode(self, image, key=None):
+        """
+        Encode an annotated frame.
+
+        :param image: BGR image.
+        :param key: Hashable identity of the image content, e.g. (frame id, overlay signature);
+                    None always encodes.
+        :return: EncodedFrame, or None if encoding failed.
+        """
+        if self.skip_unchanged and key is not None and key == self._last_key and self._last_frame is not None:
+            self.skipped_count += 1
+            return self._last_frame
+
+        image = self._scale(image)
+
+        with ENCODE_LATENCY.time():
+            ret, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        if not ret:
+            logger.error("Failed to encode frame")
+            return None
+
+        self.encoded_count += 1
+        self._last_key = key if self.skip_unchanged else None
+        self._last_frame = self.wrap(jpeg)
+        return self._last_frame
+
+    @staticmethod
+    def wrap(jpeg):
+        """
+        Wrap already encoded JPEG data (ndarray or bytes) into an EncodedFrame.
+        """
+        view = memoryview(jpeg).cast('B')
+        # join() reads straight from the buffer: one allocation for the whole part, no tobytes() copy
+        multipart = b''.join((MULTIPART_HEADER, view, MULTIPART_TRAILER))
+        return EncodedFrame(jpeg=view, multipart=multipart)
+
+    def _scale(self, image):
+        height, width = image.shape[:2]
+        if not self.stream_width or width <= self.stream_width:
+            return image
+        size = (self.stream_width, int(round(height * self.stream_width / float(width))))
+        if self._resize_buffer is None or self._resize_buffer.shape[:2] != (size[1], size[0]) \
+                or self._resize_buffer.dtype != image.dtype:
+            self._resize_buffer = np.empty((size[1], size[0]) + image.shape[2:], dtype=image.dtype)
+        # Scratch buffer: only read by imencode below, so it can be reused for every frame
+        cv2.resize(image, size, dst=self._resize_buffer, interpolation=cv2.INTER_AREA)
+        return self._resize_buffer
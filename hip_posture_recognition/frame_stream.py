@@ -0,0 +1,142 @@
+import time
+import threading
+import logging
+from functools import partial
+from metrics import EVENTS_EMITTED, FRAMES_DROPPED, FRAMES_PUSHED
+from models import ANGLE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def frame_message(frame_id, frame, measurements):
+    """
+    Build the 'frame' message: the JPEG (sent as a binary attachment) together with
+    the measurements of the same frame.
+    """
+    message = {
+        'id': frame_id,
+        'timestamp': round(time.time(), 3),
+        'jpeg': bytes(frame.jpeg),
+        'measurements': None
+    }
+    if measurements is not None:
+        message['measurements'] = {
+            field: round(float(getattr(measurements, field)), 2) for field in ANGLE_FIELDS
+        }
+    return message
+
+
+class _Subscriber:
+    def __init__(self, sid, ack_event):
+        self.sid = sid
+        self.ack_event = ack_event
+        self.active = True
+        self.sequence = 0     # Number of the last frame sent
+        self.in_flight = None  # Sequence number of the frame whose ack is awaited
+        self.sent_count = 0
+        self.skipped_count = 0
+
+
+class FrameStreamer:
+    """
+    Pushes each frame with its measurements as one binary SocketIO message, so video
+    and numbers stay in sync on the client.
+
+    Every client has at most one frame in flight: after sending, its sender task waits
+    for the client's ack and skips the frames published meanwhile, then continues with
+    the newest frame. A slow connection therefore gets fewer frames instead of a growing
+    backlog of old ones.
+    Acks are matched to the frame they belong to, so a late ack of a frame that timed
+    out does not put a second frame in flight.
+    """
+
+    def __init__(self, socketio, get_frame_source, event='frame', ack_timeout=5.0):
+        """
+        :param socketio: The SocketIO instance used to emit and run the sender tasks.
+        :param get_frame_source: Callable returning the object to wait on for frames
+                                 (Camera or FrameBroadcaster, see app.get_frame_source).
+        :param ack_timeout: Seconds to wait for an ack before sending the next frame anyway.
+        """
+        self.socketio = socketio
+        self.get_frame_source = get_frame_source
+        self.event = event
+        self.ack_timeout = ack_timeout
+        self._subscribers = {}
+        self._lock = threading.Lock()  # Socket handlers subscribe and unsubscribe concurrently
+
+    def subscribe(self, sid):
+        """
+        Start streaming to the client. Subscribing again is a no-op.
+        """
+        with self._lock:
+            if sid in self._subscribers:
+                return
+            # An event of the server's async mode (thread or gevent), set by the ack callback
+            subscriber = _Subscriber(sid, self.socketio.server.eio.create_event())
+            self._subscribers[sid] = subscriber
+        self.socketio.start_background_task(self._send_loop, subscriber)
+        logger.info(f"Frame stream started for {sid}")
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            subscriber = self._subscribers.pop(sid, None)
+        if subscriber is not None:
+            subscriber.active = False
+            subscriber.ack_event.set()  # Wake the sender so it can exit
+            logger.info(f"Frame stream stopped for {sid} "
+                        f"(sent {subscriber.sent_count}, skipped {subscriber.skipped_count})")
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _send_loop(self, subscriber):
+        frame_id = None
+        source = None
+        try:
+            while subscriber.active:
+                try:
+                    current = self.get_frame_source()
+                    if current is not source:
+                        # The camera was switched: frame ids start over
+                        if source is not None:
+                            source.remove_viewer('annotated')
+                        current.add_viewer('annotated')
+                        source = current
+                        frame_id = None
+
+                    last_sent = frame_id
+                    frame_id, frame, measurements = source.wait_for_frame(frame_id)
+                    if frame is None or not subscriber.active:
+                        continue
+                    if last_sent is not None and frame_id > last_sent + 1:
+                        # Published while the client was still busy with the previous frame
+                        skipped = frame_id - last_sent - 1
+                        subscriber.skipped_count += skipped
+                        FRAMES_DROPPED.labels('client').inc(skipped)
+
+                    subscriber.sequence += 1
+                    subscriber.in_flight = subscriber.sequence
+                    subscriber.ack_event.clear()
+                    self.socketio.emit(self.event, frame_message(frame_id, frame, measurements), to=subscriber.sid,
+                                       callback=partial(self._on_ack, subscriber, subscriber.sequence))
+                    subscriber.sent_count += 1
+                    FRAMES_PUSHED.inc()
+                    EVENTS_EMITTED.labels(self.event).inc()
+
+                    if not subscriber.ack_event.wait(self.ack_timeout) and subscriber.active:
+                        logger.warning(f"No frame ack from {subscriber.sid} within {self.ack_timeout} s")
+
+                except Exception as e:
+                    logger.error(f"Error streaming frames to {subscriber.sid}: {e}")
+                    self.socketio.sleep(0.1)
+        finally:
+            if source is not None:
+                source.remove_viewer('annotated')
+
+    def _on_ack(self, subscriber, sequence, *args):
+        # A late ack of a frame that already timed out must not release the current one
+        if subscriber.in_flight != sequence:
+            return
+        subscriber.in_flight = None
+        subscriber.ack_event.set()
@@ -0,0 +1,180 @@
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+from models import ANGLE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ('day', 'week', 'month')
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def bucket_start(timestamp, bucket):
+    """
+    Return the start (epoch seconds, local time) of the bucket containing timestamp.
+    Weeks start on Monday.
+    """
+    dt = datetime.fromtimestamp(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'week':
+        dt -= timedelta(days=dt.weekday())
+    elif bucket == 'month':
+        dt = dt.replace(day=1)
+    elif bucket != 'day':
+        raise ValueError(f"Unknown bucket: {bucket}")
+    return dt.timestamp()
+
+
+def next_bucket_start(start, bucket):
+    """
+    Return the start of the bucket following the one starting at start.
+    Computed on calendar dates, so buckets spanning a DST change stay aligned to midnight.
+    """
+    dt = datetime.fromtimestamp(start)
+    if bucket == 'day':
+        dt = (dt + timedelta(days=1)).replace(hour=0)
+    elif bucket == 'week':
+        dt = (dt + timedelta(days=7)).replace(hour=0)
+    else:
+        dt = dt.replace(year=dt.year + 1, month=1) if dt.month == 12 else dt.replace(month=dt.month + 1)
+    return dt.timestamp()
+
+
+class _BucketCache:
+    def __init__(self, limits):
+        self.limits = limits      # Thresholds the within-threshold shares were computed for
+        self.closed = {}          # bucket start -> statistics of a bucket that can no longer change
+        self.closed_until = None  # Start of the open bucket when the closed ones were computed
+        self.version = None       # Store version the closed buckets are up to date with
+
+
+class HistoryStatistics:
+    """
+    Per-day, per-week or per-month statistics of the captured measurements.
+
+    Statistics of closed buckets (before the current day/week/month) are cached and
+    reused while no records are added before the open bucket; only the open bucket
+    is recomputed on each request. Checking this costs a version() lookup, plus a
+    look at the rows added since the last request. Clearing the history, or records
+    added to the past by another process, drop the cache. One cache is kept per
+    bucket size, for the current thresholds only.
+    """
+
+    def __init__(self, store):
+        """
+        :param store: MeasurementStore to aggregate.
+        """
+        self.store = store
+        self._lock = threading.Lock()
+        self._caches = {}
+
+    def invalidate(self):
+        """
+        Drop all cached buckets (e.g. after the history was cleared).
+        """
+        with self._lock:
+            self._caches.clear()
+
+    def compute(self, bucket, thresholds, start=None, end=None, now=None):
+        """
+        Return the statistics of every non-empty bucket, oldest first.
+
+        :param bucket: 'day', 'week' or 'month'.
+        :param thresholds: PostureThresholds used for the within-threshold shares.
+        :param start: Only buckets containing or following this time (epoch seconds).
+        :param end: Only buckets starting before this time (epoch seconds).
+        :param now: Current time, defaults to time.time().
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket: {bucket}")
+        now = now if now is not None else time.time()
+        limits = (thresholds.shoulder_threshold, thresholds.hip_threshold, thresholds.tilt_threshold)
+        open_start = bucket_start(now, bucket)
+
+        with self._lock:
+            version = self.store.version()
+            cache = self._caches.get(bucket)
+            if cache is not None and cache.version != version:
+                clear_count, max_id = cache.version
+                earliest = self.store.earliest_after(max_id)
+                if version[0] != clear_count or (earliest is not None and earliest < cache.closed_until):
+                    cache = None
+                else:
+                    cache.version = version  # Only the open bucket got new records
+            if cache is None or cache.limits != limits:
+                cache = self._caches[bucket] = _BucketCache(limits)
+
+            if cache.closed_until != open_start:
+                # Buckets that closed since the last request (or all of them on first use)
+                rows = self.store.fetch_values(start=cache.closed_until, end=open_start)
+                for stats in self._aggregate(rows, bucket, limits, closed=True):
+                    cache.closed[stats['start_epoch']] = stats
+                cache.closed_until = open_start
+                cache.version = version
+
+            results = [cache.closed[key] for key in sorted(cache.closed)]
+
+        results.extend(self._aggregate(self.store.fetch_values(start=open_start), bucket, limits, closed=False))
+
+        if start is not None:
+            first = bucket_start(start, bucket)
+            results = [stats for stats in results if stats['start_epoch'] >= first]
+        if end is not None:
+            results = [stats for stats in results if stats['start_epoch'] < end]
+        return results
+
+    def _aggregate(self, rows, bucket, limits, closed):
+        """
+        Split the rows (oldest first) into buckets and compute the statistics of each.
+        """
+        if not rows:
+            return []
+        data = np.asarray(rows, dtype=np.float64)
+        timestamps, values = data[:, 0], data[:, 1:]
+
+        # Bucket boundaries are generated in Python (few), rows are split with searchsorted
+        boundaries = [bucket_start(timestamps[0], bucket)]
+        while boundaries[-1] <= timestamps[-1]:
+            boundaries.append(next_bucket_start(boundaries[-1], bucket))
+        offsets = np.searchsorted(timestamps, boundaries, side='left')
+
+        within = np.abs(values) <= np.asarray(limits)
+        results = []
+        for i in range(len(boundaries) - 1):
+            lo, hi = offsets[i], offsets[i + 1]
+            if lo == hi:
+                continue
+            results.append(self._bucket_stats(values[lo:hi], within[lo:hi],
+                                              boundaries[i], boundaries[i + 1], closed))
+        return results
+
+    @staticmethod
+    def _bucket_stats(values, within, start, end, closed):
+        percentiles = np.percentile(values, PERCENTILES, axis=0)
+        means = values.mean(axis=0)
+        mean_abs = np.abs(values).mean(axis=0)
+        minimums = values.min(axis=0)
+        maximums = values.max(axis=0)
+        within_share = within.mean(axis=0)
+
+        stats = {
+            'start': datetime.fromtimestamp(start).isoformat(),
+            'end': datetime.fromtimestamp(end).isoformat(),
+            'start_epoch': start,
+            'closed': closed,
+            'count': int(len(values)),
+            'within_thresholds': round(float(within.all(axis=1).mean()), 4)
+        }
+        for j, field in enumerate(ANGLE_FIELDS):
+            field_stats = {
+                'mean': round(float(means[j]), 2),
+                'mean_abs': round(float(mean_abs[j]), 2),
+                'min': round(float(minimums[j]), 2),
+                'max': round(float(maximums[j]), 2),
+                'within_threshold': round(float(within_share[j]), 4)
+            }
+            for k, p in enumerate(PERCENTILES):
+                field_stats[f'p{p}'] = round(float(percentiles[k, j]), 2)
+            stats[field] = field_stats
+        return stats
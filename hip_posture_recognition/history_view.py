@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(timestamp, record_id):
+    """
+    Encode the (timestamp, id) key of the next history page as an opaque cursor string.
+    """
+    return f"{float(timestamp)!r}:{int(record_id)}"
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor into a (timestamp, id) key, or None for no cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        timestamp, record_id = cursor.rsplit(':', 1)
+        return float(timestamp), int(record_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def local_offsets(timestamps):
+    """
+    Return the local UTC offset in seconds for every timestamp. The offset is looked
+    up once per distinct hour, not per record; only records in an hour during which
+    the offset changes (a DST switch in a half-hour time zone) are looked up individually.
+    """
+    hours = np.floor_divide(timestamps, 3600.0).astype(np.int64)
+    unique_hours, inverse = np.unique(hours, return_inverse=True)
+    starts = np.array([time.localtime(int(h) * 3600).tm_gmtoff for h in unique_hours], dtype=np.float64)
+    ends = np.array([time.localtime(int(h) * 3600 + 3599).tm_gmtoff for h in unique_hours], dtype=np.float64)
+    offsets = starts[inverse]
+    for i in np.flatnonzero((starts != ends)[inverse]):
+        offsets[i] = time.localtime(int(timestamps[i])).tm_gmtoff
+    return offsets
+
+
+def format_timestamps(timestamps):
+    """
+    Format epoch timestamps as local time strings.
+
+    :return: (timestamp 'YYYY-MM-DD HH:MM:SS', date 'YYYY-MM-DD', time 'HH:MM:SS') string arrays.
+    """
+    local = np.floor(timestamps + local_offsets(timestamps)).astype('datetime64[s]')
+    text = np.datetime_as_string(local, unit='s').astype('U19')  # 'YYYY-MM-DDTHH:MM:SS'
+    chars = text.view('U1').reshape(-1, 19)
+    dates = np.ascontiguousarray(chars[:, :10]).view('U10').ravel()
+    times = np.ascontiguousarray(chars[:, 11:]).view('U8').ravel()
+    chars = chars.copy()
+    chars[:, 10] = ' '
+    return chars.view('U19').ravel(), dates, times
+
+
+def format_records(ids, timestamps, shoulder_angles, hip_angles, tilt_angles):
+    """
+    Build the history records used by history.html and /api/history from columns.
+    Formatting and rounding are done on whole arrays; only the final dicts are per record.
+    """
+    if len(ids) == 0:
+        return []
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    stamp_strs, date_strs, time_strs = format_timestamps(timestamps)
+    angles = np.round(np.column_stack((shoulder_angles, hip_angles, tilt_angles)).astype(np.float64), 1)
+
+    return [
+        {
+            'id': record_id,
+            'epoch': epoch,
+            'timestamp': stamp,
+            'date_str': date_str,
+            'time_str': time_str,
+            'measurements': {
+                'shoulder_angle': shoulder,
+                'hip_angle': hip,
+                'tilt_angle': tilt
+            }
+        }
+        for record_id, epoch, stamp, date_str, time_str, (shoulder, hip, tilt) in zip(
+            np.asarray(ids).tolist(), timestamps.tolist(), stamp_strs.tolist(),
+            date_strs.tolist(), time_strs.tolist(), angles.tolist()
+        )
+    ]
+
+
+class HistoryView:
+    """
+    Precomputed view-model of the history page.
+
+    Reads only the first page of the history from the store (keyset query on the
+    timestamp index) and formats it with vectorized operations. The result (records,
+    their JSON and the cursor of the next page) is kept until the store's version
+    changes, i.e. until the next capture or clear.
+    """
+
+    def __init__(self, store, page_size=50):
+        """
+        :param store: MeasurementStore providing page() and version().
+        :param page_size: Number of records rendered into the page.
+        """
+        self.store = store
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._version = None
+        self._page = None
+
+    def first_page(self):
+        """
+        :return: (records, records as JSON, cursor of the next page or None)
+        """
+        with self._lock:
+            version = self.store.version()
+            if self._page is None or version != self._version:
+                rows, next_key = self.store.page(limit=self.page_size)
+                records = format_records(
+                    [record_id for record_id, _ in rows],
+                    [m.timestamp for _, m in rows],
+                    [m.shoulder_angle for _, m in rows],
+                    [m.hip_angle for _, m in rows],
+                    [m.tilt_angle for _, m in rows]
+                )
+                next_cursor = encode_cursor(*next_key) if next_key is not None else None
+                self._page = (records, json.dumps(records), next_cursor)
+                self._version = version
+            return self._page
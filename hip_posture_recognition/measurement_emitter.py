@@ -0,0 +1,152 @@
+import time
+import threading
+import logging
+from functools import partial
+from metrics import EVENTS_EMITTED
+from models import ANGLE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+class _Client:
+    def __init__(self, sid, flush_interval):
+        self.sid = sid
+        self.pending = []
+        self.flush_interval = flush_interval
+        self.last_sent = 0.0
+        self.in_flight = None  # Sequence number of the message waiting for its ack
+        self.sent_at = 0.0
+
+
+class MeasurementEmitter:
+    """
+    Change-driven emission of live measurements to SocketIO clients.
+
+    A sample is only sent when any angle moved more than the deadband since the last
+    accepted sample, or when the keepalive interval expired. Every client has at most
+    one message in flight: accepted samples are collected per client until it has
+    acknowledged its previous message and its flush interval has passed, then sent as
+    one 'measurements' message. A slow client therefore gets fewer, batched messages,
+    and its flush interval backs off while its acks take long.
+    """
+
+    def __init__(self, emit, event='measurements', deadband=0.2, keepalive_interval=1.0,
+                 flush_interval=1 / 30, max_flush_interval=0.5, max_batch=15, ack_timeout=5.0):
+        """
+        :param emit: Callable (event, payload, to=sid, callback=ack), e.g. socketio.emit.
+        :param deadband: Minimum change in degrees of any angle for a sample to be sent.
+        :param keepalive_interval: Send the current values after this many seconds without a new sample.
+        :param flush_interval: Minimum seconds between two messages to a client.
+        :param max_flush_interval: Upper bound for a client's flush interval while its acks are slow.
+        :param max_batch: Maximum number of samples kept in one message.
+        :param ack_timeout: Seconds after which an unacknowledged message no longer blocks the client.
+        """
+        self.emit = emit
+        self.event = event
+        self.deadband = deadband
+        self.keepalive_interval = keepalive_interval
+        self.base_flush_interval = flush_interval
+        self.max_flush_interval = max_flush_interval
+        self.max_batch = max_batch
+        self.ack_timeout = ack_timeout
+        self._clients = {}
+        self._lock = threading.Lock()  # Never held while emitting
+        self._sequence = 0
+        self._reference = None
+        self._last_accepted = 0.0
+        self.emitted_count = 0
+        self.suppressed_count = 0
+
+    def add_client(self, sid):
+        with self._lock:
+            if sid not in self._clients:
+                self._clients[sid] = _Client(sid, self.base_flush_interval)
+
+    def remove_client(self, sid):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def submit(self, measurements, timestamp=None):
+        """
+        Offer the measurements of a new frame. Sends a message to every client that can
+        take one if the values changed enough (or the keepalive expired). Without
+        measurements (the pose was lost) the samples still pending are sent.
+
+        :return: True if a message was emitted.
+        """
+        if measurements is None:
+            return self.flush()
+        now = timestamp if timestamp is not None else time.time()
+        sample = {field: round(float(getattr(measurements, field)), 2) for field in ANGLE_FIELDS}
+        sample['timestamp'] = round(now, 3)
+
+        with self._lock:
+            if self._changed(sample) or now - self._last_accepted >= self.keepalive_interval:
+                self._reference = sample
+                self._last_accepted = now
+                for client in self._clients.values():
+                    client.pending.append(sample)
+                    del client.pending[:-self.max_batch]
+            else:
+                self.suppressed_count += 1
+        return self.flush()
+
+    def _changed(self, sample):
+        if self._reference is None:
+            return True
+        return any(abs(sample[field] - self._reference[field]) > self.deadband for field in ANGLE_FIELDS)
+
+    def flush(self):
+        """
+        Send the pending samples of every client that has no message in flight and whose
+        flush interval has passed. The latest sample is sent at the top level (as before),
+        earlier coalesced ones are included in 'samples'. Call it periodically so samples
+        held back by a late ack are not left waiting for the next frame.
+
+        :return: True if a message was emitted.
+        """
+        now = time.monotonic()
+        messages = []
+        with self._lock:
+            for client in self._clients.values():
+                if not client.pending:
+                    continue
+                if client.in_flight is not None:
+                    if now - client.sent_at < self.ack_timeout:
+                        continue
+                    logger.warning(f"No measurements ack from {client.sid} within {self.ack_timeout} s")
+                    client.in_flight = None
+                    client.flush_interval = self.max_flush_interval
+                if now - client.last_sent < client.flush_interval:
+                    continue
+
+                payload = dict(client.pending[-1])
+                if len(client.pending) > 1:
+                    payload['samples'] = client.pending
+                client.pending = []
+                self._sequence += 1
+                client.in_flight = self._sequence
+                client.sent_at = client.last_sent = now
+                messages.append((client, self._sequence, payload))
+
+        for client, sequence, payload in messages:
+            try:
+                self.emit(self.event, payload, to=client.sid, callback=partial(self._on_ack, client, sequence))
+                self.emitted_count += 1
+                EVENTS_EMITTED.labels(self.event).inc()
+            except Exception as e:
+                logger.error(f"Error emitting measurements: {e}")
+        return bool(messages)
+
+    def _on_ack(self, client, sequence, *args):
+        with self._lock:
+            if client.in_flight != sequence:
+                # Ack of a message that already timed out
+                return
+            client.in_flight = None
+            round_trip = time.monotonic() - client.sent_at
+            # Back off while the client needs a noticeable share of the interval to ack, recover afterwards
+            if round_trip > client.flush_interval / 2:
+                client.flush_interval = min(self.max_flush_interval, client.flush_interval * 2)
+            else:
+                client.flush_interval = max(self.base_flush_interval, client.flush_interval * 0.9)
@@ -0,0 +1,259 @@
+import sqlite3
+import threading
+import json
+import os
+import logging
+from models import PostureMeasurements
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    shoulder_angle REAL NOT NULL,
+    hip_angle REAL NOT NULL,
+    tilt_angle REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_measurements_timestamp ON measurements (timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+COLUMNS = "id, timestamp, shoulder_angle, hip_angle, tilt_angle"
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), 'captured_measurements.db')
+LEGACY_JSON_PATH = os.path.join(os.path.dirname(__file__), 'captured_measurements.json')
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    """
+    Return the process-wide store at the default location, creating it
+    (and migrating captured_measurements.json) on first use.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = MeasurementStore(DEFAULT_DB_PATH, legacy_json_path=LEGACY_JSON_PATH)
+        return _default_store
+
+
+class MeasurementStore:
+    """
+    Append-only SQLite storage for captured measurements.
+
+    Every capture is a single INSERT, independent of the history size, and queries
+    use the timestamp index instead of loading every record. The old
+    captured_measurements.json file is imported once on first start.
+    """
+
+    def __init__(self, db_path, legacy_json_path=None):
+        """
+        :param db_path: Path of the SQLite database file.
+        :param legacy_json_path: Path of a captured_measurements.json to migrate, if present.
+        """
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        if legacy_json_path:
+            self._migrate_legacy_json(legacy_json_path)
+
+    def _migrate_legacy_json(self, json_path):
+        """
+        Import the records of the old JSON history once. The JSON file is left in
+        place as a backup; a meta flag prevents a second import.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'legacy_json_migrated'").fetchone()
+            if row is not None or not os.path.exists(json_path):
+                return
+            try:
+                with open(json_path, 'r') as f:
+                    data = json.load(f)
+                rows = []
+                for m in data:
+                    try:
+                        rows.append((
+                            float(m['timestamp']),
+                            float(m['shoulder_angle']),
+                            float(m['hip_angle']),
+                            float(m['tilt_angle'])
+                        ))
+                    except Exception as e:
+                        logger.error(f"Error converting measurement during migration: {e}")
+                # Oldest first, so ids follow capture order
+                rows.sort(key=lambda r: r[0])
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO measurements (timestamp, shoulder_angle, hip_angle, tilt_angle) "
+                        "VALUES (?, ?, ?, ?)", rows
+                    )
+                    self._conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('legacy_json_migrated', ?)", (json_path,)
+                    )
+                logger.info(f"Migrated {len(rows)} measurements from {json_path}")
+            except Exception as e:
+                logger.error(f"Error migrating measurements from {json_path}: {e}")
+
+    @staticmethod
+    def _to_measurement(row):
+        return PostureMeasurements(
+            shoulder_angle=row[2],
+            hip_angle=row[3],
+            tilt_angle=row[4],
+            timestamp=row[1]
+        )
+
+    def append(self, measurement):
+        """
+        Store one measurement.
+
+        :return: The row id of the new record.
+        """
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO measurements (timestamp, shoulder_angle, hip_angle, tilt_angle) VALUES (?, ?, ?, ?)",
+                    (float(measurement.timestamp), float(measurement.shoulder_angle),
+                     float(measurement.hip_angle), float(measurement.tilt_angle))
+                )
+            return cursor.lastrowid
+
+    def iter_measurements(self, start=None, end=None, limit=None, newest_first=True):
+        """
+        Iterate over measurements in a time range, without loading them all at once.
+
+        :param start: Only measurements with timestamp >= start (epoch seconds).
+        :param end: Only measurements with timestamp < end (epoch seconds).
+        :param limit: Maximum number of measurements.
+        :param newest_first: Sort order by timestamp.
+        """
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(float(start))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(float(end))
+        query = f"SELECT {COLUMNS} FROM measurements"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        order = "DESC" if newest_first else "ASC"
+        query += f" ORDER BY timestamp {order}, id {order}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for row in rows:
+                yield self._to_measurement(row)
+
+    def page(self, start=None, end=None, limit=50, after=None):
+        """
+        Return one page of measurements, newest first, using keyset pagination:
+        the page continues strictly after the (timestamp, id) key of the previous
+        page's last row, so the cost does not depend on how deep the page is.
+
+        :param start: Only measurements with timestamp >= start (epoch seconds).
+        :param end: Only measurements with timestamp < end (epoch seconds).
+        :param limit: Page size.
+        :param after: (timestamp, id) key returned for the previous page, or None for the first page.
+        :return: (list of (id, PostureMeasurements), key of the next page or None)
+        """
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(float(start))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(float(end))
+        if after is not None:
+            # Written so the timestamp index can be used for the range scan
+            conditions.append("timestamp <= ? AND (timestamp < ? OR id < ?)")
+            params.extend((float(after[0]), float(after[0]), int(after[1])))
+        query = f"SELECT {COLUMNS} FROM measurements"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # One extra row tells whether there is a next page
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(int(limit) + 1)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (rows[-1][1], rows[-1][0])
+        return [(row[0], self._to_measurement(row)) for row in rows], next_key
+
+    def fetch_values(self, start=None, end=None):
+        """
+        Return the raw values of a time range, oldest first, as a list of
+        (timestamp, shoulder_angle, hip_angle, tilt_angle) tuples for array conversion.
+        """
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(float(start))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(float(end))
+        query = "SELECT timestamp, shoulder_angle, hip_angle, tilt_angle FROM measurements"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY timestamp ASC, id ASC"
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def version(self):
+        """
+        Return (clear count, max id): it changes with every capture or clear of the
+        history and never repeats, since ids are not reused. Both are index lookups,
+        so this is cheap to call on every request.
+        """
+        with self._lock:
+            return tuple(self._conn.execute(
+                "SELECT COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'clear_count'), 0), "
+                "COALESCE(MAX(id), 0) FROM measurements"
+            ).fetchone())
+
+    def earliest_after(self, row_id):
+        """
+        Return the oldest timestamp of the records with an id above row_id, or None.
+        Reads only the newer rows, so it tells cheaply whether the records added
+        since a version() went into the past.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(timestamp) FROM measurements WHERE id > ?", (int(row_id),)
+            ).fetchone()[0]
+
+    def clear(self):
+        """
+        Delete all measurements.
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM measurements")
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('clear_count', 1) "
+                    "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+                )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,319 @@
+import bisect
+import math
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from sub-millisecond encodes up to slow inference on a Pi
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class _ThreadCells:
+    """
+    One mutable cell per writing thread.
+
+    Each thread only ever writes its own cell, so updates need no lock; the lock is
+    taken once per thread to register the cell and when collecting. Cells of threads
+    that have ended are folded into a base value, so short-lived request threads do
+    not accumulate.
+    """
+
+    def __init__(self, new_cell):
+        self._new_cell = new_cell
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cells = []          # (thread, cell)
+        self._retired = new_cell()
+
+    def cell(self):
+        cell = getattr(self._local, 'cell', None)
+        if cell is None:
+            cell = self._new_cell()
+            self._local.cell = cell
+            with self._lock:
+                self._cells.append((threading.current_thread(), cell))
+        return cell
+
+    def collect(self, merge):
+        """
+        Merge all cells with merge(total, cell) into a fresh cell and return it.
+        """
+        with self._lock:
+            alive = []
+            for thread, cell in self._cells:
+                if thread.is_alive():
+                    alive.append((thread, cell))
+                else:
+                    merge(self._retired, cell)
+            self._cells = alive
+            total = self._new_cell()
+            merge(total, self._retired)
+            for _, cell in alive:
+                merge(total, cell)
+            return total
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        """
+        :param name: Metric name, e.g. 'posture_frames_captured_total'.
+        :param documentation: Help text.
+        :param labelnames: Names of the labels; use labels(...) to get a child per label value.
+        :param registry: Registry to add the metric to (default: REGISTRY).
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._children_lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        """
+        Return the child metric for the given label values (created on first use).
+        """
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._children_lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _series(self):
+        if self.labelnames:
+            return sorted(self._children.items())
+        return [((), self)]
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for values, child in self._series():
+            lines.extend(child._samples(self.name, self.labelnames, values))
+        return lines
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing counter with lock-free per-thread cells.
+    """
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._init_child()
+
+    def _new_child(self):
+        return Counter.__new__(Counter)._init_child()
+
+    def _init_child(self):
+        self._cells = _ThreadCells(lambda: [0.0])
+        return self
+
+    def inc(self, amount=1):
+        self._cells.cell()[0] += amount
+
+    @staticmethod
+    def _merge(total, cell):
+        total[0] += cell[0]
+
+    def value(self):
+        return self._cells.collect(self._merge)[0]
+
+    def _samples(self, name, labelnames, values):
+        return [f'{name}{_format_labels(labelnames, values)} {_format_value(self.value())}']
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down. inc/dec use per-thread cells; set() replaces the
+    value (the cells are reset), and set_function() computes it at collection time.
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._init_child()
+
+    def _new_child(self):
+        return Gauge.__new__(Gauge)._init_child()
+
+    def _init_child(self):
+        self._cells = _ThreadCells(lambda: [0.0])
+        self._base = 0.0
+        self._function = None
+        return self
+
+    def inc(self, amount=1):
+        self._cells.cell()[0] += amount
+
+    def dec(self, amount=1):
+        self._cells.cell()[0] -= amount
+
+    def set(self, value):
+        # Rare compared to inc/dec: fold the cells away so the new value is exact
+        self._cells = _ThreadCells(lambda: [0.0])
+        self._base = float(value)
+
+    def set_function(self, function):
+        """
+        Compute the value with function() whenever the metric is collected.
+        """
+        self._function = function
+
+    @staticmethod
+    def _merge(total, cell):
+        total[0] += cell[0]
+
+    def value(self):
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception as e:
+                logger.error(f"Error collecting gauge value: {e}")
+                return math.nan
+        return self._base + self._cells.collect(self._merge)[0]
+
+    def _samples(self, name, labelnames, values):
+        value = self.value()
+        text = 'NaN' if math.isnan(value) else _format_value(value)
+        return [f'{name}{_format_labels(labelnames, values)} {text}']
+
+
+class Histogram(_Metric):
+    """
+    Histogram of observed values (e.g. latencies in seconds) with per-thread
+    bucket counts; exposed with cumulative buckets, sum and count.
+    """
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+        self._init_child()
+
+    def _new_child(self):
+        child = Histogram.__new__(Histogram)
+        child.buckets = self.buckets
+        return child._init_child()
+
+    def _init_child(self):
+        size = len(self.buckets) + 1   # Last bucket is +Inf
+        # Cell layout: [count per bucket..., sum, count]
+        self._size = size
+        self._cells = _ThreadCells(lambda: [0.0] * (size + 2))
+        return self
+
+    def observe(self, value):
+        cell = self._cells.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def time(self):
+        """
+        Context manager observing the duration of the enclosed block in seconds.
+        """
+        return _HistogramTimer(self)
+
+    @staticmethod
+    def _merge(total, cell):
+        for i, value in enumerate(cell):
+            total[i] += value
+
+    def _samples(self, name, labelnames, values):
+        total = self._cells.collect(self._merge)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), total[:self._size]):
+            cumulative += count
+            labels = _format_labels(labelnames, values, ('le', _format_value(bound)))
+            lines.append(f'{name}_bucket{labels} {_format_value(cumulative)}')
+        labels = _format_labels(labelnames, values)
+        lines.append(f'{name}_sum{labels} {_format_value(total[-2])}')
+        lines.append(f'{name}_count{labels} {_format_value(total[-1])}')
+        return lines
+
+
+class _HistogramTimer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Registry:
+    """
+    Collection of metrics exposed together.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def expose(self):
+        """
+        Return all metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Pipeline metrics
+FRAMES_CAPTURED = Counter('posture_frames_captured_total', 'Frames read from the camera device')
+FRAMES_CAPTURE_FAILED = Counter('posture_frames_capture_failed_total', 'Failed reads from the camera device')
+FRAMES_DROPPED = Counter('posture_frames_dropped_total',
+                         'Frames replaced before the next pipeline stage picked them up', ['stage'])
+FRAMES_PROCESSED = Counter('posture_frames_processed_total', 'Frames that went through pose inference')
+FRAMES_STREAMED = Counter('posture_frames_streamed_total', 'Frames sent to MJPEG viewers')
+FRAMES_PUSHED = Counter('posture_frames_pushed_total', 'Frames sent to SocketIO frame stream clients')
+INFERENCE_LATENCY = Histogram('posture_inference_latency_seconds',
+                              'Pose detection and angle calculation time per frame')
+TILT_LATENCY = Histogram('posture_frame_tilt_latency_seconds', 'Hough frame tilt estimation time', ['mode'])
+ENCODE_LATENCY = Histogram('posture_encode_latency_seconds', 'JPEG encoding time per frame')
+VIEWERS = Gauge('posture_video_viewers', 'Connected MJPEG viewers')
+EVENTS_EMITTED = Counter('posture_socketio_events_emitted_total', 'SocketIO events emitted', ['event'])
+TEST_MODE_FALLBACKS = Counter('posture_test_mode_fallbacks_total',
+                              'Switches to test mode because the camera failed')
+TEST_MODE = Gauge('posture_camera_test_mode', '1 while the camera runs in test mode')
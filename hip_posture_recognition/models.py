@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+
+# Angle attributes of PostureMeasurements, in the order used by messages and statistics
+ANGLE_FIELDS = ('shoulder_angle', 'hip_angle', 'tilt_angle')
+
+@dataclass
+class PostureMeasurements:
+    shoulder_angle: float
+    hip_angle: float
+    tilt_angle: float
+    timestamp: float = None
+
+@dataclass
+class PostureThresholds:
+    shoulder_threshold: float = 5.0
+    hip_threshold: float = 5.0
+    tilt_threshold: float = 2.0
@@ -0,0 +1,343 @@
+import math
+import threading
+import time
+import logging
+import numpy as np
+from metrics import FRAMES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+
+def is_new_frame(result, last_frame_id):
+    """
+    Whether a (frame_id, payload, ...) tuple read from a frame slot holds a frame
+    the caller has not seen yet.
+    """
+    return result[1] is not None and result[0] != last_frame_id
+
+
+class LatestQueue:
+    """
+    A size-1 "latest wins" queue between two pipeline stages.
+    Putting an item replaces any item that has not been consumed yet,
+    so a slow consumer always works on the newest frame instead of a backlog.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._condition = threading.Condition()
+        self._item = None
+        self._has_item = False
+        self._closed = False
+        self.put_count = 0
+        self.dropped_count = 0
+
+    def put(self, item):
+        """
+        Store an item, dropping the previous one if it was not consumed.
+        """
+        with self._condition:
+            if self._has_item:
+                self.dropped_count += 1
+                FRAMES_DROPPED.labels(self.name).inc()
+            self._item = item
+            self._has_item = True
+            self.put_count += 1
+            self._condition.notify()
+
+    def get(self, timeout=1.0):
+        """
+        Take the current item, waiting up to timeout seconds for one to arrive.
+
+        :return: The item, or None on timeout or when the queue was closed.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._has_item or self._closed, timeout=timeout)
+            if not self._has_item:
+                return None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    def close(self):
+        """
+        Drop any pending item and wake up waiting consumers.
+        """
+        with self._condition:
+            self._closed = True
+            self._item = None
+            self._has_item = False
+            self._condition.notify_all()
+
+    def reopen(self):
+        """
+        Make a closed queue usable again (used when the pipeline is restarted).
+        """
+        with self._condition:
+            self._closed = False
+
+
+class StageTimer:
+    """
+    Collect timing statistics for one pipeline stage.
+    Keeps the last value, a moving average and the maximum, in milliseconds.
+    """
+
+    def __init__(self, name, smoothing=0.1):
+        self.name = name
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self.count = 0
+        self.last_ms = 0.0
+        self.avg_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds):
+        """
+        Record the duration of one stage run.
+        """
+        ms = seconds * 1000.0
+        with self._lock:
+            self.count += 1
+            self.last_ms = ms
+            self.avg_ms = ms if self.count == 1 else self.avg_ms + self.smoothing * (ms - self.avg_ms)
+            self.max_ms = max(self.max_ms, ms)
+
+    def time(self):
+        """
+        Context manager measuring the enclosed block.
+        """
+        return _StageTimerContext(self)
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.last_ms = 0.0
+            self.avg_ms = 0.0
+            self.max_ms = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'last_ms': round(self.last_ms, 2),
+                'avg_ms': round(self.avg_ms, 2),
+                'max_ms': round(self.max_ms, 2)
+            }
+
+
+class _StageTimerContext:
+    def __init__(self, timer):
+        self.timer = timer
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.record(time.perf_counter() - self.started)
+        return False
+
+
+class KeyframeScheduler:
+    """
+    Decide which grabbed frames are sent to pose inference.
+
+    Inference runs on every Nth frame, where N follows the measured inference time
+    and camera frame interval, so the inference stage can keep up while the
+    video stream itself runs at the full camera rate.
+    """
+
+    def __init__(self, min_interval=2, max_interval=8, smoothing=0.1):
+        """
+        :param min_interval: Smallest N (2 = inference on every other frame).
+        :param max_interval: Largest N, bounds how long landmarks are extrapolated.
+        :param smoothing: Weight of new samples in the moving averages.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        self.interval = min_interval
+        self._frames_since_keyframe = 0
+        self._last_frame_time = None
+        self._frame_interval = None
+        self._inference_time = None
+
+    def record_frame(self, timestamp):
+        """
+        Update the measured camera frame interval with a new grab timestamp.
+        """
+        if self._last_frame_time is not None:
+            delta = timestamp - self._last_frame_time
+            if delta > 0:
+                self._frame_interval = delta if self._frame_interval is None else \
+                    self._frame_interval + self.smoothing * (delta - self._frame_interval)
+        self._last_frame_time = timestamp
+        self._adapt()
+
+    def record_inference(self, seconds):
+        """
+        Update the measured inference time.
+        """
+        self._inference_time = seconds if self._inference_time is None else \
+            self._inference_time + self.smoothing * (seconds - self._inference_time)
+        self._adapt()
+
+    def _adapt(self):
+        if not self._frame_interval or self._inference_time is None:
+            return
+        needed = int(math.ceil(self._inference_time / self._frame_interval))
+        self.interval = max(self.min_interval, min(self.max_interval, needed))
+
+    def is_keyframe(self):
+        """
+        Return True if the current frame should go to pose inference.
+        """
+        self._frames_since_keyframe += 1
+        if self._frames_since_keyframe >= self.interval:
+            self._frames_since_keyframe = 0
+            return True
+        return False
+
+    def reset(self):
+        self.interval = self.min_interval
+        self._frames_since_keyframe = 0
+        self._last_frame_time = None
+        self._frame_interval = None
+        self._inference_time = None
+
+
+class LandmarkPredictor:
+    """
+    Provide landmarks for frames between two inference keyframes.
+
+    Holds the landmarks of the last keyframe ('hold') or extrapolates them linearly
+    from the last two keyframes ('extrapolate'), limited to max_horizon seconds.
+    """
+
+    def __init__(self, mode='extrapolate', max_horizon=0.25, max_keyframe_gap=0.5):
+        """
+        :param mode: 'hold' or 'extrapolate'.
+        :param max_horizon: Maximum time in seconds landmarks are extrapolated past a keyframe.
+        :param max_keyframe_gap: Keyframes further apart than this are not used for a velocity.
+        """
+        self.mode = mode
+        self.max_horizon = max_horizon
+        self.max_keyframe_gap = max_keyframe_gap
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._last_time = None
+            self._last_landmarks = None
+            self._velocity = None
+            self._frame_tilt = None
+
+    def update(self, timestamp, landmarks, frame_tilt):
+        """
+        Store the result of an inference keyframe.
+
+        :param timestamp: Capture time of the keyframe.
+        :param landmarks: (33, 4) landmark array, or None if no pose was found.
+        :param frame_tilt: Frame tilt of the keyframe.
+        """
+        with self._lock:
+            self._frame_tilt = frame_tilt
+            velocity = None
+            if landmarks is not None and self._last_landmarks is not None:
+                gap = timestamp - self._last_time
+                if 0 < gap <= self.max_keyframe_gap:
+                    velocity = (landmarks[:, :3] - self._last_landmarks[:, :3]) / gap
+            self._velocity = velocity
+            self._last_time = timestamp
+            self._last_landmarks = landmarks
+
+    def predict(self, timestamp):
+        """
+        Return (landmarks, frame_tilt) for a frame captured at timestamp.
+        landmarks is None if the last keyframe had no pose.
+        """
+        with self._lock:
+            landmarks = self._last_landmarks
+            if landmarks is None or self.mode != 'extrapolate' or self._velocity is None:
+                return landmarks, self._frame_tilt
+
+            dt = min(max(timestamp - self._last_time, 0.0), self.max_horizon)
+            predicted = landmarks.copy()
+            predicted[:, :3] += self._velocity * dt
+            return predicted, self._frame_tilt
+
+
+class OneEuroFilter:
+    """
+    Vectorized One-Euro filter for landmark coordinates.
+
+    Every element of the input array is filtered independently with a low-pass whose
+    cutoff frequency rises with the element's speed: slow jitter is smoothed strongly,
+    fast movements pass with little lag. With beta=0 it is a plain exponential moving
+    average with a fixed cutoff. The state is two arrays of the input shape.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.01, d_cutoff=1.0):
+        """
+        :param min_cutoff: Cutoff frequency in Hz at zero speed; lower = smoother.
+        :param beta: Cutoff increase per unit of speed (pixels/s); higher = less lag.
+        :param d_cutoff: Cutoff frequency in Hz used to smooth the speed estimate.
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self._reset_pending = False
+        self._clear()
+
+    def reset(self):
+        """
+        Restart the filter with the next sample. Safe to call from another thread than
+        the one filtering: it only sets a flag, which the next call consumes before it
+        touches the state, so a reset can never hit a half-updated filter.
+        """
+        self._reset_pending = True
+
+    def _clear(self):
+        self._x = None
+        self._dx = None
+        self._t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, values, timestamp):
+        """
+        Filter a new sample.
+
+        :param values: Array of raw values (e.g. the x, y, z columns of the landmarks).
+        :param timestamp: Capture time of the sample in seconds.
+        :return: The filtered array (same shape).
+        """
+        if self._reset_pending:
+            self._reset_pending = False
+            self._clear()
+        if self._x is None:
+            self._x = values.astype(np.float32, copy=True)
+            self._dx = np.zeros_like(self._x)
+            self._t = timestamp
+            return self._x.copy()
+
+        dt = timestamp - self._t
+        if dt <= 0:
+            return self._x.copy()
+
+        dx = (values - self._x) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        self._dx += a_d * (dx - self._dx)
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self._dx)
+        a = self._alpha(cutoff, dt)
+        self._x += a * (values - self._x)
+        self._t = timestamp
+        return self._x.copy()
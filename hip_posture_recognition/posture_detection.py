@@ -2,6 +2,7 @@ import cv2
 import mediapipe as mp
 import numpy as np
 from dataclasses import dataclass
+from camera import PERFORMANCE_PROFILES, create_pose
 
 @dataclass
 class PostureMeasurements:
@@ -10,13 +11,10 @@ class PostureMeasurements:
     hip_shift: float
 
 class PostureDetector:
-    def __init__(self):
+    def __init__(self, profile='balanced'):
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            min_detection_confidence=0.5,
-            model_complexity=1
-        )
+        self.profile = PERFORMANCE_PROFILES[profile]
+        self.pose = create_pose(self.profile)
         
     def process_frame(self, frame):
         image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -0,0 +1,284 @@
+import os
+import tempfile
+import threading
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# History rows listed one per line; older rows are summarised. ReportLab keeps every
+# finished page in memory until save(), so this bounds the memory of a report
+MAX_REPORT_ROWS = 2000
+
+GOOD_COLOR = (0x52 / 255.0, 0xc4 / 255.0, 0x1a / 255.0)     # green
+WARNING_COLOR = (0xfa / 255.0, 0xad / 255.0, 0x14 / 255.0)  # orange
+CRITICAL_COLOR = (0xf5 / 255.0, 0x22 / 255.0, 0x2d / 255.0)  # red
+
+# (label, attribute, threshold) of the angles in the report
+REPORT_ANGLES = (
+    ("Shoulder Angle", 'shoulder_angle', 5),
+    ("Hip Angle", 'hip_angle', 5),
+    ("Frame Tilt", 'tilt_angle', 2)
+)
+
+
+class ReportRenderer:
+    """
+    Render the scoliosis analysis PDF report.
+
+    ReportLab is imported and the logos are read and decoded on the first report, not
+    at application start; both are reused for every later report. Measurements are
+    consumed from an iterator and written row by row, and the PDF is rendered to a
+    temporary file that is streamed to the client in chunks, so no list of
+    measurements is kept. ReportLab holds the finished pages until the PDF is saved,
+    which grows with the page count: only the newest max_rows measurements are
+    listed, older ones are summarised in a few lines.
+    """
+
+    def __init__(self, static_folder, max_rows=MAX_REPORT_ROWS):
+        """
+        :param static_folder: Flask static folder containing img/HHN_LOGO.png and img/unityLab.jpg.
+        :param max_rows: Number of history rows listed one per line.
+        """
+        self.static_folder = static_folder
+        self.max_rows = max_rows
+        self.hhn_logo = None
+        self.unity_logo = None
+        self._logos_loaded = False
+        self._logos_lock = threading.Lock()
+
+    def _load_logos(self):
+        with self._logos_lock:
+            if not self._logos_loaded:
+                self.hhn_logo = self._load_logo(os.path.join(self.static_folder, 'img', 'HHN_LOGO.png'))
+                self.unity_logo = self._load_logo(os.path.join(self.static_folder, 'img', 'unityLab.jpg'))
+                self._logos_loaded = True
+
+    @staticmethod
+    def _load_logo(path):
+        from reportlab.lib.utils import ImageReader
+
+        try:
+            logo = ImageReader(path)
+            logo.getRGBData()  # Decode now; ImageReader keeps the pixel data for later reports
+            return logo
+        except Exception as e:
+            logger.error(f"Error loading logo {path}: {e}")
+            return None
+
+    def _draw_logos(self, p, width, height):
+        try:
+            if self.hhn_logo is not None:
+                p.drawImage(self.hhn_logo, 50, height - 100, width=100, height=80, mask='auto')
+            if self.unity_logo is not None:
+                p.drawImage(self.unity_logo, width - 120, height - 80, width=70, height=60, mask='auto')
+        except Exception as e:
+            logger.error(f"Error drawing logos: {e}")
+
+    def render(self, measurements, path):
+        """
+        Write the report to a file.
+
+        :param measurements: Iterable of PostureMeasurements, newest first. It is
+                             consumed once; the first item is the latest measurement.
+        :param path: Output file path.
+        """
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import letter
+
+        self._load_logos()
+        p = canvas.Canvas(path, pagesize=letter, pageCompression=1)
+        width, height = letter
+        measurements = iter(measurements)
+        latest = next(measurements, None)
+
+        self._draw_logos(p, width, height)
+
+        # Title and header
+        p.setFont("Helvetica-Bold", 24)
+        p.drawString(50, height - 150, "Scoliosis Analysis Report")
+        p.setFont("Helvetica", 12)
+        p.drawString(50, height - 180, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+        if latest is not None:
+            p.setFont("Helvetica-Bold", 16)
+            p.drawString(50, height - 220, "Latest Captured Measurement")
+            p.setFont("Helvetica", 12)
+            y = height - 250
+
+            for label, attribute, threshold in REPORT_ANGLES:
+                value = getattr(latest, attribute)
+                if abs(value) <= threshold:
+                    p.setFillColorRGB(*GOOD_COLOR)
+                elif abs(value) <= threshold * 2:
+                    p.setFillColorRGB(*WARNING_COLOR)
+                else:
+                    p.setFillColorRGB(*CRITICAL_COLOR)
+                p.drawString(70, y, f"{label}: {value:.1f}°")
+                y -= 20
+
+            second = next(measurements, None)
+            if second is not None:
+                p.showPage()
+                self._draw_history(p, width, height, [latest, second], measurements)
+
+        p.save()
+
+    def _draw_history(self, p, width, height, first, rest):
+        self._draw_logos(p, width, height)
+        p.setFillColorRGB(0, 0, 0)
+        p.setFont("Helvetica-Bold", 16)
+        p.drawString(50, height - 150, "Measurement History")
+
+        # One text object per page instead of one per row
+        text = p.beginText(70, height - 180)
+        text.setFont("Helvetica", 12)
+        text.setLeading(20)
+
+        listed = 0
+        older = _Summary()
+        for rows in (first, rest):
+            for m in rows:
+                try:
+                    timestamp_str = datetime.fromtimestamp(float(m.timestamp)).strftime('%Y-%m-%d %H:%M:%S')
+                except Exception as e:
+                    logger.error(f"Error parsing timestamp in report: {e}")
+                    continue
+
+                good = all(abs(getattr(m, attribute)) <= threshold for _, attribute, threshold in REPORT_ANGLES)
+                if listed >= self.max_rows:
+                    older.add(m, good)
+                    continue
+                listed += 1
+                status = "Good" if good else "Needs Attention"
+
+                text.textLine(
+                    f"Time: {timestamp_str} - Status: {status} | "
+                    f"Shoulder: {m.shoulder_angle:.1f}° | "
+                    f"Hip: {m.hip_angle:.1f}° | "
+                    f"Tilt: {m.tilt_angle:.1f}°"
+                )
+
+                # Paginate if out of space
+                if text.getY() < 50:
+                    text = self._next_page(p, text, height)
+
+        if older.count:
+            lines = older.lines()
+            if text.getY() - 20 * (len(lines) + 2) < 50:
+                text = self._next_page(p, text, height)
+            text.textLine("")
+            for line in lines:
+                text.textLine(line)
+        p.drawText(text)
+
+    @staticmethod
+    def _next_page(p, text, height):
+        p.drawText(text)
+        p.showPage()
+        text = p.beginText(70, height - 50)
+        text.setFont("Helvetica", 12)
+        text.setLeading(20)
+        return text
+
+    def render_to_tempfile(self, measurements):
+        """
+        Render the report into a new temporary file and return its path.
+        The caller is responsible for deleting it (FileStream does).
+        """
+        fd, path = tempfile.mkstemp(prefix='scoliosis_report_', suffix='.pdf')
+        os.close(fd)
+        try:
+            self.render(measurements, path)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+
+class _Summary:
+    """
+    Running count, time range and angle statistics of the history rows beyond max_rows.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.good = 0
+        self.newest = None
+        self.oldest = None
+        self.totals = {attribute: 0.0 for _, attribute, _ in REPORT_ANGLES}
+        self.minimums = {attribute: float('inf') for _, attribute, _ in REPORT_ANGLES}
+        self.maximums = {attribute: float('-inf') for _, attribute, _ in REPORT_ANGLES}
+
+    def add(self, m, good):
+        # Rows come newest first
+        timestamp = float(m.timestamp)
+        if self.newest is None:
+            self.newest = timestamp
+        self.oldest = timestamp
+        self.count += 1
+        self.good += good
+        for _, attribute, _ in REPORT_ANGLES:
+            value = getattr(m, attribute)
+            self.totals[attribute] += value
+            self.minimums[attribute] = min(self.minimums[attribute], value)
+            self.maximums[attribute] = max(self.maximums[attribute], value)
+
+    def lines(self):
+        def time_str(timestamp):
+            return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+        lines = [
+            f"{self.count} older measurements ({time_str(self.oldest)} to {time_str(self.newest)}), "
+            f"{self.good / self.count:.0%} Good:"
+        ]
+        for label, attribute, _ in REPORT_ANGLES:
+            lines.append(f"{label}: mean {self.totals[attribute] / self.count:.1f}° | "
+                         f"min {self.minimums[attribute]:.1f}° | max {self.maximums[attribute]:.1f}°")
+        return lines
+
+
+class FileStream:
+    """
+    Response body that yields the contents of a file in chunks and deletes the file
+    afterwards if requested.
+
+    The file is deleted in close(), which the WSGI server calls on every response
+    body, also when it is never iterated (HEAD request, client gone before the first
+    chunk). The file is opened on the first read.
+    """
+
+    def __init__(self, path, delete=True, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.delete = delete
+        self.chunk_size = chunk_size
+        self._file = None
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            self.close()
+            raise StopIteration
+        return chunk
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._file is not None:
+            self._file.close()
+        if self.delete:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.error(f"Error removing report file {self.path}: {e}")
@@ -0,0 +1,188 @@
+import os
+import glob
+import hashlib
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'report_cache')
+
+
+@dataclass
+class ReportJob:
+    id: str
+    key: str
+    params: dict
+    status: str = 'queued'      # queued, running, done, failed
+    cached: bool = False
+    path: str = None
+    error: str = None
+    created: float = field(default_factory=time.time)
+    finished: float = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'cached': self.cached,
+            'params': self.params,
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished
+        }
+
+
+class ReportJobManager:
+    """
+    Render PDF reports in a worker pool instead of the request thread.
+
+    A report is identified by the history version, its parameters and the current
+    hour. Rendered PDFs are kept in the cache directory under that key, so requesting
+    the same report again without new captures is served from disk without rendering;
+    an identical job that is still queued or running is shared instead of started
+    twice. The hour is part of the key because the PDF states when it was generated:
+    a cached report is at most an hour older than that line claims.
+    """
+
+    def __init__(self, renderer, store, cache_dir=DEFAULT_CACHE_DIR, max_workers=2,
+                 max_cached_reports=20, job_ttl=3600):
+        """
+        :param renderer: ReportRenderer used for the PDFs.
+        :param store: MeasurementStore the reports are generated from.
+        :param cache_dir: Directory of the rendered PDFs.
+        :param max_workers: Number of reports rendered in parallel.
+        :param max_cached_reports: Number of PDFs kept in the cache directory.
+        :param job_ttl: Seconds finished jobs stay available for polling.
+        """
+        self.renderer = renderer
+        self.store = store
+        self.cache_dir = cache_dir
+        self.max_cached_reports = max_cached_reports
+        self.job_ttl = job_ttl
+        os.makedirs(cache_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._serving = {}  # Path -> number of downloads currently streaming it
+
+    def _cache_key(self, params):
+        version = self.store.version()
+        hour = time.strftime('%Y%m%d%H')
+        text = f"{version}|{hour}|{params.get('from')}|{params.get('to')}|{params.get('limit')}"
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f'report_{key}.pdf')
+
+    def submit(self, params):
+        """
+        Create a report job.
+
+        :param params: {'from': epoch or None, 'to': epoch or None, 'limit': int or None}
+        :return: The ReportJob; already 'done' if the report is in the cache.
+        """
+        key = self._cache_key(params)
+        path = self._cache_path(key)
+        with self._lock:
+            self._prune_jobs()
+            for job in self._jobs.values():
+                if job.key == key and job.status in ('queued', 'running'):
+                    return job
+
+            job = ReportJob(id=uuid.uuid4().hex, key=key, params=params, path=path)
+            self._jobs[job.id] = job
+            if os.path.exists(path):
+                os.utime(path)  # Keep recently used reports in the cache
+                job.status = 'done'
+                job.cached = True
+                job.finished = time.time()
+                return job
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def acquire(self, job):
+        """
+        Mark the PDF of a finished job as being downloaded, so pruning the cache skips
+        it until release() is called.
+
+        :return: The path of the PDF.
+        :raises FileNotFoundError: If the PDF was removed from the cache.
+        """
+        with self._lock:
+            if not os.path.exists(job.path):
+                raise FileNotFoundError(job.path)
+            self._serving[job.path] = self._serving.get(job.path, 0) + 1
+            return job.path
+
+    def release(self, path):
+        with self._lock:
+            count = self._serving.get(path, 0) - 1
+            if count > 0:
+                self._serving[path] = count
+            else:
+                self._serving.pop(path, None)
+
+    def _run(self, job):
+        job.status = 'running'
+        started = time.perf_counter()
+        tmp_path = f'{job.path}.{job.id}.tmp'
+        try:
+            measurements = self.store.iter_measurements(
+                start=job.params.get('from'),
+                end=job.params.get('to'),
+                limit=job.params.get('limit'),
+                newest_first=True
+            )
+            self.renderer.render(measurements, tmp_path)
+            os.replace(tmp_path, job.path)  # Readers never see a partial file
+            job.status = 'done'
+            logger.info(f"Rendered report {job.id} in {time.perf_counter() - started:.2f} s")
+        except Exception as e:
+            logger.error(f"Error rendering report {job.id}: {e}")
+            job.status = 'failed'
+            job.error = str(e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        finally:
+            job.finished = time.time()
+        self._prune_cache()
+
+    def _prune_jobs(self):
+        now = time.time()
+        for job_id in [job.id for job in self._jobs.values()
+                       if job.finished is not None and now - job.finished > self.job_ttl]:
+            del self._jobs[job_id]
+
+    def _prune_cache(self):
+        """
+        Delete the least recently used PDFs beyond max_cached_reports, except those
+        that are being downloaded.
+        """
+        with self._lock:
+            try:
+                paths = sorted(glob.glob(os.path.join(self.cache_dir, 'report_*.pdf')), key=os.path.getmtime)
+            except OSError as e:
+                logger.error(f"Error pruning report cache: {e}")
+                return
+            for path in paths[:-self.max_cached_reports]:
+                if path in self._serving:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.error(f"Error pruning report cache: {e}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,99 @@
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RoiTracker:
+    """
+    Track the region of the frame that contains the patient, so pose inference
+    can run on a crop instead of the full frame.
+
+    The region is the bounding box of the visible landmarks of the previous frame,
+    enlarged by a margin. When no person was found the tracker is reset and the
+    next inference runs on the full frame again.
+    """
+
+    def __init__(self, margin=0.25, min_visibility=0.5, min_landmarks=6, max_inference_width=None,
+                 min_size=96, max_area_ratio=0.85):
+        """
+        :param margin: Fraction of the bounding box size added on every side.
+        :param min_visibility: Landmarks below this visibility are ignored for the bounding box.
+        :param min_landmarks: Minimum number of visible landmarks to keep tracking.
+        :param max_inference_width: If set, crops wider than this are downscaled before inference.
+        :param min_size: Minimum crop width/height in pixels.
+        :param max_area_ratio: Use the full frame when the crop would cover more than this share of it.
+        """
+        self.margin = margin
+        self.min_visibility = min_visibility
+        self.min_landmarks = min_landmarks
+        self.max_inference_width = max_inference_width
+        self.min_size = min_size
+        self.max_area_ratio = max_area_ratio
+        self.reset()
+
+    def reset(self):
+        """
+        Drop the tracked region; the next frame is processed in full.
+        """
+        self.region = None
+        self.tracked_frames = 0
+        self.lost_count = 0
+
+    def get_region(self, frame_shape):
+        """
+        Return the crop region (x0, y0, x1, y1) for the next frame, or None for the full frame.
+        """
+        if self.region is None:
+            return None
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = self.region
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(width, x1), min(height, y1)
+        if x1 - x0 < self.min_size or y1 - y0 < self.min_size:
+            return None
+        if (x1 - x0) * (y1 - y0) > self.max_area_ratio * width * height:
+            return None
+        return x0, y0, x1, y1
+
+    def update(self, landmarks):
+        """
+        Update the tracked region from the landmarks of the last inference.
+
+        :param landmarks: (33, 4) landmark array in full-frame pixels, or None if no pose was found.
+        """
+        if landmarks is None:
+            if self.region is not None:
+                self.lost_count += 1
+            self.reset_region()
+            return
+
+        visible = landmarks[landmarks[:, 3] >= self.min_visibility]
+        if len(visible) < self.min_landmarks:
+            self.lost_count += 1
+            self.reset_region()
+            return
+
+        x_min, y_min = visible[:, 0].min(), visible[:, 1].min()
+        x_max, y_max = visible[:, 0].max(), visible[:, 1].max()
+        margin_x = (x_max - x_min) * self.margin
+        margin_y = (y_max - y_min) * self.margin
+        self.region = (
+            int(np.floor(x_min - margin_x)),
+            int(np.floor(y_min - margin_y)),
+            int(np.ceil(x_max + margin_x)),
+            int(np.ceil(y_max + margin_y))
+        )
+        self.tracked_frames += 1
+
+    def reset_region(self):
+        self.region = None
+        self.tracked_frames = 0
+
+    def inference_scale(self, crop_width):
+        """
+        Return the factor the crop should be resized by before inference (1.0 = no downscale).
+        """
+        if self.max_inference_width and crop_width > self.max_inference_width:
+            return self.max_inference_width / float(crop_width)
+        return 1.0
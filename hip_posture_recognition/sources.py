@@ -0,0 +1,151 @@
+import glob
+import os
+import time
+import logging
+import cv2
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+class _FrameSource:
+    """
+    Common behaviour of the file-based sources. They offer the subset of the
+    cv2.VideoCapture interface the Camera uses (isOpened, read, release), so they can
+    replace a capture device.
+    """
+
+    def __init__(self, fps, loop=False, realtime=False):
+        """
+        :param fps: Frame rate of the recording.
+        :param loop: Start over at the end instead of reporting the end of the source.
+        :param realtime: Deliver frames at the recording's frame rate (live replay);
+                         otherwise read() returns as fast as frames can be decoded.
+        """
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.loop = loop
+        self.realtime = realtime
+        self.frame_index = -1
+        self._next_due = None
+
+    @property
+    def timestamp(self):
+        """
+        Position of the last frame read, in seconds from the start of the recording.
+        """
+        return max(self.frame_index, 0) / self.fps
+
+    def _pace(self):
+        if not self.realtime:
+            return
+        now = time.monotonic()
+        if self._next_due is None or now - self._next_due > 1.0:
+            # First frame, or we fell far behind: do not try to catch up with a burst
+            self._next_due = now
+        elif self._next_due > now:
+            time.sleep(self._next_due - now)
+        self._next_due += 1.0 / self.fps
+
+    def read(self):
+        """
+        :return: (success, frame) like cv2.VideoCapture.read.
+        """
+        self._pace()
+        success, frame = self._read_next()
+        if not success and self.loop and self.frame_index >= 0:
+            self._rewind()
+            success, frame = self._read_next()
+        return success, frame
+
+
+class VideoSource(_FrameSource):
+    """
+    Frames of a video file or a network stream (e.g. rtsp:// or http:// URL).
+    """
+
+    def __init__(self, path, loop=False, realtime=False):
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        super().__init__(self.capture.get(cv2.CAP_PROP_FPS), loop=loop, realtime=realtime)
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    @property
+    def timestamp(self):
+        position = self.capture.get(cv2.CAP_PROP_POS_MSEC)
+        return position / 1000.0 if position > 0 else super().timestamp
+
+    def _read_next(self):
+        success, frame = self.capture.read()
+        if success:
+            self.frame_index += 1
+        return success, frame
+
+    def _rewind(self):
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        self.capture.release()
+
+
+class ImageSequenceSource(_FrameSource):
+    """
+    Frames from image files, in file name order.
+    """
+
+    def __init__(self, paths, fps=30.0, loop=False, realtime=False):
+        super().__init__(fps, loop=loop, realtime=realtime)
+        self.paths = list(paths)
+        self.frame_count = len(self.paths)
+        self._position = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def _read_next(self):
+        while self._position < len(self.paths):
+            path = self.paths[self._position]
+            self._position += 1
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is None:
+                logger.error(f"Could not read image {path}")
+                continue
+            self.frame_index += 1
+            return True, frame
+        return False, None
+
+    def _rewind(self):
+        self._position = 0
+
+    def release(self):
+        self.paths = []
+
+
+def open_source(spec, loop=False, realtime=False, fps=None):
+    """
+    Open a file-based frame source.
+
+    :param spec: Video file, stream URL, directory of images or glob pattern of images.
+    :param loop: Start over at the end of the source.
+    :param realtime: Pace reads to the source frame rate.
+    :param fps: Frame rate of an image sequence (default 30).
+    """
+    # URLs may contain '?' (query string) and file names '[', so only other specs can be globs
+    is_video = '://' in spec or os.path.isfile(spec)
+    if not is_video and os.path.isdir(spec):
+        paths = sorted(path for path in glob.glob(os.path.join(spec, '*'))
+                       if path.lower().endswith(IMAGE_EXTENSIONS))
+    elif not is_video and any(char in spec for char in '*?['):
+        paths = sorted(glob.glob(spec))
+    else:
+        source = VideoSource(spec, loop=loop, realtime=realtime)
+        if not source.isOpened():
+            raise ValueError(f"Could not open video source {spec}")
+        return source
+
+    if not paths:
+        raise ValueError(f"No images found for {spec}")
+    return ImageSequenceSource(paths, fps=fps or 30.0, loop=loop, realtime=realtime)
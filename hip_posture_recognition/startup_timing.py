@@ -0,0 +1,39 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimings:
+    """
+    Seconds from the start of the application to startup milestones (imports done,
+    server starting, first camera frame). Each milestone is recorded and logged once.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        """
+        Record a milestone unless it was already recorded.
+
+        :return: Seconds since the start for this milestone.
+        """
+        with self._lock:
+            if name in self.marks:
+                return self.marks[name]
+            elapsed = round(time.monotonic() - self.started, 3)
+            self.marks[name] = elapsed
+        logger.info(f"Startup timing: {name} after {elapsed:.3f} s")
+        return elapsed
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.marks)
+
+
+# Created when app.py starts importing, before the heavy modules
+STARTUP = StartupTimings()
@@ -81,18 +81,33 @@ document.addEventListener('DOMContentLoaded', function() {
             button.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Generating report...';
 
             try {
-                const response = await fetch('/generate_report');
+                // The report is rendered in the background; poll the job until it is ready
+                const response = await fetch('/reports', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({})
+                });
                 if (!response.ok) {
                     throw new Error(`Failed to generate report: ${response.statusText}`);
                 }
-                const blob = await response.blob();
-                const url = window.URL.createObjectURL(blob);
+                let job = await response.json();
+                while (job.status === 'queued' || job.status === 'running') {
+                    await new Promise(resolve => setTimeout(resolve, 500));
+                    const statusResponse = await fetch(job.status_url);
+                    if (!statusResponse.ok) {
+                        throw new Error(`Failed to get report status: ${statusResponse.statusText}`);
+                    }
+                    job = await statusResponse.json();
+                }
+                if (job.status !== 'done') {
+                    throw new Error(job.error || 'Report generation failed');
+                }
+
                 const a = document.createElement('a');
-                a.href = url;
+                a.href = job.download_url;
                 a.download = `posture_report_${new Date().toISOString().slice(0,19).replace(/[:-]/g, '')}.pdf`;
                 document.body.appendChild(a);
                 a.click();
-                window.URL.revokeObjectURL(url);
                 document.body.removeChild(a);
             } catch (error) {
                 console.error('Error downloading report:', error);
@@ -255,12 +270,123 @@ document.addEventListener('DOMContentLoaded', function() {
     let lastMeasurements = null;
     let capturedMeasurements = null;  // New variable to store measurements at capture time
 
-    socket.on('measurements', function(data) {
-        if (!data) return;
+    function showMeasurements(data) {
         lastMeasurements = data;  // Store the latest measurements
         updateGauge(data.shoulder_angle, 'shoulder-gauge', currentThresholds.shoulder_threshold);
         updateGauge(data.hip_angle, 'hip-gauge', currentThresholds.hip_threshold);
         updateGauge(data.tilt_angle, 'tilt-gauge', currentThresholds.tilt_threshold);
+    }
+
+    // Video over SocketIO: every 'frame' message carries the JPEG and the measurements
+    // of that frame. The ack is sent once the image is decoded; until then the server
+    // skips frames for this client, so a slow connection never builds up a backlog.
+    const videoFeed = document.getElementById('video-feed');
+    const useFrameStream = videoFeed !== null && videoFeed.dataset.transport === 'socketio';
+    let frameUrl = null;
+
+    if (useFrameStream) {
+        socket.on('connect', () => {
+            socket.emit('start_frame_stream');
+        });
+
+        socket.on('frame', function(message, ack) {
+            const url = URL.createObjectURL(new Blob([message.jpeg], { type: 'image/jpeg' }));
+            videoFeed.onload = videoFeed.onerror = () => {
+                if (frameUrl) {
+                    URL.revokeObjectURL(frameUrl);
+                }
+                frameUrl = url;
+                if (ack) {
+                    ack();
+                }
+            };
+            videoFeed.src = url;
+            if (message.measurements) {
+                showMeasurements(message.measurements);
+            }
+        });
+    }
+
+    // Landmark mode: the server only sends the overlay geometry ('pose' events at the
+    // full frame rate) and a raw video at a lower rate; the overlay is drawn here.
+    const poseCanvas = document.getElementById('pose-overlay');
+    const OVERLAY_RED = 'rgb(255, 0, 0)';
+    const OVERLAY_GREEN = 'rgb(0, 255, 0)';
+    const OVERLAY_PINK = 'rgb(180, 105, 255)';
+
+    function drawPoint(ctx, point, color) {
+        ctx.fillStyle = color;
+        ctx.beginPath();
+        ctx.arc(point[0], point[1], 10, 0, 2 * Math.PI);
+        ctx.fill();
+    }
+
+    function drawLine(ctx, start, end, color, dash) {
+        ctx.strokeStyle = color;
+        ctx.lineWidth = 2;
+        ctx.setLineDash(dash || []);
+        ctx.beginPath();
+        ctx.moveTo(start[0], start[1]);
+        ctx.lineTo(end[0], end[1]);
+        ctx.stroke();
+        ctx.setLineDash([]);
+    }
+
+    function drawPose(pose) {
+        const ctx = poseCanvas.getContext('2d');
+        // The canvas uses the pixel coordinates of the analyzed frame and is scaled like the video
+        if (pose.width && (poseCanvas.width !== pose.width || poseCanvas.height !== pose.height)) {
+            poseCanvas.width = pose.width;
+            poseCanvas.height = pose.height;
+        }
+        ctx.clearRect(0, 0, poseCanvas.width, poseCanvas.height);
+        ctx.font = '24px sans-serif';
+        ctx.fillStyle = 'white';
+
+        if (pose.frame_tilt !== null) {
+            ctx.fillText(`Frame Tilt: ${pose.frame_tilt.toFixed(2)}`, 10, 30);
+        }
+
+        pose.connections.forEach(connection => {
+            const [point1, point2] = connection.points;
+            const color = connection.exceeded ? OVERLAY_RED : OVERLAY_GREEN;
+
+            ctx.fillStyle = 'white';
+            const midX = (point1[0] + point2[0]) / 2;
+            const midY = (point1[1] + point2[1]) / 2;
+            ctx.fillText(`${connection.angle.toFixed(1)}°`, midX - 40, midY - 40);
+
+            drawLine(ctx, point1, point2, color);
+            drawPoint(ctx, point1, color);
+            drawPoint(ctx, point2, color);
+
+            // Reference correction line
+            if (connection.correction) {
+                drawPoint(ctx, connection.correction, OVERLAY_PINK);
+                drawLine(ctx, point1, connection.correction, OVERLAY_PINK, [2, 10]);
+            }
+        });
+    }
+
+    if (poseCanvas) {
+        socket.on('connect', () => {
+            socket.emit('start_pose_stream');
+        });
+
+        socket.on('pose', function(pose) {
+            drawPose(pose);
+            if (pose.measurements) {
+                showMeasurements(pose.measurements);
+            }
+        });
+    }
+
+    socket.on('measurements', function(data, ack) {
+        // Acknowledge first: the server sends the next message only after the ack
+        if (ack) ack();
+        // With the frame or pose stream the gauges follow the frames instead
+        if (!data || useFrameStream || poseCanvas) return;
+        showMeasurements(data);
     });
 
     function startCountdown() {
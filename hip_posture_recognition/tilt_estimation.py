@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+import logging
+from metrics import TILT_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class TiltEstimator:
+    """
+    Adaptive frame tilt estimation for a fixed camera mount.
+
+    The Hough line detection runs on a downscaled grayscale image and only every
+    refresh_interval frames, or earlier when the camera moved (e.g. it was bumped).
+    Camera motion is detected on the border of the image, where the background is,
+    and only counts when it persists for motion_frames frames, so a person moving in
+    front of the camera does not trigger it. Between estimations the cached,
+    exponentially smoothed tilt is returned; after camera motion the next few frames
+    are estimated too and get a larger weight, but are still smoothed.
+    """
+
+    def __init__(self, scale_width=320, refresh_interval=30, motion_threshold=12.0, motion_frames=3,
+                 border=0.2, smoothing=0.3, motion_smoothing=0.6, settle_estimates=4, hough_threshold=200):
+        """
+        :param scale_width: Width in pixels the frame is downscaled to before edge detection.
+        :param refresh_interval: Recompute the tilt at least every N frames.
+        :param motion_threshold: Mean absolute gray level difference (0-255) of the border of
+                                 a thumbnail that counts as camera motion.
+        :param motion_frames: Consecutive frames above motion_threshold that force a recomputation.
+        :param border: Share of the width/height at the top, left and right used for motion detection.
+        :param smoothing: Weight of a new estimate in the moving average (0-1].
+        :param motion_smoothing: Weight of a new estimate after camera motion (0-1].
+        :param settle_estimates: Estimations on the frames following camera motion, to converge
+                                 to the new mount position.
+        :param hough_threshold: Hough accumulator threshold at full 640px width, scaled down
+                                with the image.
+        """
+        self.scale_width = scale_width
+        self.refresh_interval = refresh_interval
+        self.motion_threshold = motion_threshold
+        self.motion_frames = motion_frames
+        self.smoothing = smoothing
+        self.motion_smoothing = motion_smoothing
+        self.settle_estimates = settle_estimates
+        self.hough_threshold = hough_threshold
+        # Thumbnail cells used for motion detection: the top, left and right border. The
+        # bottom is left out, the patient's legs reach it
+        self._border_mask = np.ones((24, 32), dtype=bool)
+        rows, cols = int(round(24 * border)), int(round(32 * border))
+        self._border_mask[rows:, cols:32 - cols] = False
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the cached tilt so the next frame is estimated from scratch.
+        """
+        self.tilt = None
+        self.frames_since_update = 0
+        self.estimation_count = 0
+        self._moving_frames = 0
+        self._settling = 0
+        self._reference_thumbnail = None
+
+    def update(self, frame):
+        """
+        Return the current frame tilt in degrees, recomputing it only when needed.
+
+        :param frame: BGR frame at full resolution.
+        :return: The smoothed tilt angle, or None if no lines were ever found.
+        """
+        try:
+            height, width = frame.shape[:2]
+            scale = min(1.0, self.scale_width / float(width))
+            small = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            thumbnail = cv2.resize(gray, (32, 24), interpolation=cv2.INTER_AREA)
+
+            self.frames_since_update += 1
+            if self._reference_thumbnail is not None:
+                difference = cv2.absdiff(thumbnail, self._reference_thumbnail)
+                motion = float(np.mean(difference[self._border_mask]))
+                self._moving_frames = self._moving_frames + 1 if motion > self.motion_threshold else 0
+            if self._moving_frames >= self.motion_frames:
+                self._settling = self.settle_estimates + 1
+            moved = self._settling > 0
+
+            if self.tilt is not None and not moved and self.frames_since_update < self.refresh_interval:
+                return self.tilt
+            if moved:
+                self._settling -= 1
+
+            self._reference_thumbnail = thumbnail
+            self.frames_since_update = 0
+            self._moving_frames = 0
+            self.estimation_count += 1
+
+            estimate = self._estimate(gray, scale * width / 640.0)
+            if estimate is not None:
+                if self.tilt is None:
+                    self.tilt = estimate
+                else:
+                    # After camera motion follow the new mount position faster, but a single
+                    # estimate (e.g. of a frame full of a person) never replaces the tilt
+                    weight = self.motion_smoothing if moved else self.smoothing
+                    self.tilt += weight * (estimate - self.tilt)
+            return self.tilt
+
+        except Exception as e:
+            logger.error(f"Error estimating frame tilt: {e}")
+            return self.tilt
+
+    def _estimate(self, gray, relative_scale):
+        """
+        Estimate the tilt of a grayscale image from the median angle of its dominant lines.
+        """
+        with TILT_LATENCY.labels('adaptive').time():
+            edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+            threshold = max(int(self.hough_threshold * relative_scale), 30)
+            lines = cv2.HoughLines(edges, 1, np.pi / 180, threshold)
+        if lines is None:
+            return None
+        angles = (lines[:, 0, 1] - np.pi / 2) * (180 / np.pi)
+        return float(np.median(angles))